@@ -0,0 +1,192 @@
+import json
+import os
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def brute_force_search(vectors: np.ndarray, query: np.ndarray, k: int):
+    """Exact top-k by inner product (cosine trên vector đã chuẩn hoá)"""
+    scores = vectors @ query
+    top = top_k(scores, k)
+    return top, scores[top]
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over L2-normalized vectors.
+
+    Vectors are bucketed by their nearest k-means centroid; a query only
+    scores the vectors of its `nprobe` closest buckets. Raising nprobe trades
+    speed for recall (nprobe == n_lists is an exact search).
+    """
+
+    def __init__(self, n_lists: int = None, nprobe: int = 16, n_iter: int = 20, max_train_size: int = 50_000, seed: int = 0):
+        """
+        :param n_lists: Số cụm, mặc định ~4*sqrt(N) lúc train
+        :param nprobe: Số cụm được quét cho mỗi truy vấn
+        """
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.max_train_size = max_train_size
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def train(self, vectors: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        sample = vectors
+        if len(vectors) > self.max_train_size:
+            sample = vectors[np.sort(rng.choice(len(vectors), self.max_train_size, replace=False))]
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+
+        # Spherical k-means: centroid là trung bình cụm, chuẩn hoá lại về độ dài 1
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        self.n_lists = n_lists
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._lists = None
+
+    def add(self, vectors: np.ndarray):
+        """Assign new vectors; their ids continue from len(self)"""
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors")
+        if len(vectors) == 0:
+            return
+        labels = self._nearest(np.asarray(vectors, dtype=np.float32), self.centroids).astype(np.int32)
+        self.assignments = np.concatenate([self.assignments, labels])
+        self._lists = None
+
+    def probe(self, query: np.ndarray, nprobe: int = None) -> np.ndarray:
+        """Candidate ids from the `nprobe` closest lists"""
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        closest = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        lists = self._inverted_lists()
+        return np.concatenate([lists[i] for i in closest])
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int, nprobe: int = None):
+        """Approximate top-k: exact scores, but only over probed candidates"""
+        candidates = self.probe(query, nprobe)
+        top, scores = brute_force_search(vectors[candidates], query, k)
+        return candidates[top], scores
+
+    def save(self, path: str):
+        """Centroid, cấu hình và toàn bộ gán cụm; chỉ cần gọi sau khi train"""
+        np.save(os.path.join(path, "ivf_centroids.npy"), self.centroids)
+        with open(os.path.join(path, "ivf.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_lists": self.n_lists, "nprobe": self.nprobe, "n_iter": self.n_iter, "seed": self.seed}, f)
+        self.save_assignments(path)
+
+    def save_assignments(self, path: str, start: int = 0):
+        """Write assignments[start:]: start=0 rewrites the file, start>0 only appends the new rows"""
+        with open(os.path.join(path, "ivf_assignments.i32"), "ab" if start else "wb") as f:
+            f.write(self.assignments[start:].astype(np.int32).tobytes())
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(os.path.join(path, "ivf.json")):
+            return None
+        with open(os.path.join(path, "ivf.json"), encoding="utf-8") as f:
+            index = cls(**json.load(f))
+        index.centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+        assignments_file = os.path.join(path, "ivf_assignments.i32")
+        if os.path.exists(assignments_file):
+            index.assignments = np.fromfile(assignments_file, dtype=np.int32)
+        else:
+            # Định dạng cũ (.npy ghi lại toàn bộ mỗi lần lưu)
+            index.assignments = np.load(os.path.join(path, "ivf_assignments.npy")).astype(np.int32)
+        return index
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(self.n_lists + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.n_lists)]
+        return self._lists
+
+    @staticmethod
+    def _nearest(vectors, centroids, chunk_size: int = 8192):
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            labels[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        return labels
+
+
+def recall_at_k(index: IVFIndex, vectors: np.ndarray, queries: np.ndarray, k: int = 5, nprobe: int = None) -> float:
+    """Fraction of the exact top-k that the index also returns"""
+    hits = 0
+    for query in queries:
+        exact, _ = brute_force_search(vectors, query, k)
+        approx, _ = index.search(vectors, query, k, nprobe)
+        hits += len(set(exact.tolist()) & set(approx.tolist()))
+    return hits / (k * len(queries))
+
+
+def _normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+if __name__ == "__main__":
+    # Kiểm tra recall so với brute force trên dữ liệu tổng hợp có cấu trúc cụm
+    import time
+
+    rng = np.random.default_rng(42)
+    n, dim, k = 50_000, 256, 5
+    centers = rng.normal(size=(500, dim))
+    vectors = _normalize(centers[rng.integers(0, 500, n)] + 0.6 * rng.normal(size=(n, dim))).astype(np.float32)
+    queries = _normalize(vectors[rng.choice(n, 200, replace=False)] + 0.3 * rng.normal(size=(200, dim))).astype(np.float32)
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    index.train(vectors[: n // 2])
+    index.add(vectors[: n // 2])
+    index.add(vectors[n // 2:])  # thêm dần sau khi đã train
+    print(f"Train + add {n} vectors ({index.n_lists} lists): {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    for query in queries:
+        brute_force_search(vectors, query, k)
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"Brute force: {exact_ms:.2f} ms/query")
+
+    for nprobe in (1, 4, 8, 16, 32):
+        start = time.perf_counter()
+        for query in queries:
+            index.search(vectors, query, k, nprobe)
+        ms = (time.perf_counter() - start) / len(queries) * 1000
+        recall = recall_at_k(index, vectors, queries, k, nprobe)
+        print(f"nprobe={nprobe:>3}: recall@{k}={recall:.3f}, {ms:.2f} ms/query")
+
+    assert recall_at_k(index, vectors, queries, k, index.n_lists) == 1.0, "nprobe == n_lists phải khớp brute force"
+    assert recall_at_k(index, vectors, queries, k, 32) >= 0.9, "recall@5 với nprobe=32 thấp hơn mong đợi"
+    print("✅ Recall check passed.")
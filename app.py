@@ -5,20 +5,15 @@ from semantic_router.route import Route
 from semantic_router.router import SemanticRouter
 from semantic_router.samples import productsSample, chitchatSample
 from reflection import Reflection
+from pipeline import SpeculativePipeline
+from semantic_cache import SemanticCache
+from context_manager import ProductContext
+from catalog_sync import sync_catalog, print_summary
 import pandas as pd
 import openai
 import os
 import numpy as np
 
-# Hàm ghép thông tin sản phẩm
-def build_combine_row(row):
-    combine = f"Tên sản phẩm: {row['title']}\n"
-    combine += f"Mô tả: {row['product_specs']}\n"
-    combine += f"Giá: {row['current_price']}\n"
-    combine += f"Ưu đãi: {row['product_promotion']}\n"
-    combine += f"Màu sắc: {row['color_options']}\n"
-    return combine
-
 # Khởi tạo session_state để lưu hội thoại
 def init_session():
     if "messages" not in st.session_state:
@@ -29,83 +24,89 @@ Nếu không tìm thấy câu trả lời, hãy lịch sự trả lời rằng h
 Hãy ưu tiên ngắn gọn, dễ hiểu. Nếu khách hỏi gợi ý sản phẩm, hãy liệt kê một vài mẫu phù hợp và lý do tại sao nên chọn.
 Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình."""}
         ]
+    if "product_context" not in st.session_state:
+        st.session_state.product_context = ProductContext(st.session_state.messages[0]["content"])
     if "history" not in st.session_state:
         st.session_state.history = []
 
 # Hàm load dữ liệu và setup
 @st.cache_resource(show_spinner="🔄 Đang load dữ liệu...")
 def setup():
-    df = pd.read_csv("hoanghamobile.csv")
-    df['information'] = df.apply(build_combine_row, axis=1)
-
     vector_db = VectorDatabase(db_type="mongodb")
-    embedding = Embeddings(model_name="text-embedding-3-small", type="openai")
+    embedding = Embeddings(model_name="text-embedding-3-small", type="openai", cache="embedding_cache.sqlite")
 
     routes = [
         Route(name="products", samples=productsSample),
         Route(name="chitchat", samples=chitchatSample)
     ]
-    router = SemanticRouter(embedding, routes)
-
-    if vector_db.count_documents("products") == 0:
-        for _, row in df.iterrows():
-            embedding_vector = embedding.encode(row['information'])
-            vector_db.insert_document(
-                "products",
-                {
-                    "title": row['title'],
-                    "embedding": embedding_vector,
-                    "information": row['information']
-                }
-            )
-    return embedding, vector_db, router
+    router = SemanticRouter(embedding, routes, aggregation="topk", top_k=5, margin=0.4)
 
-# Hàm xử lý truy vấn người dùng
-def handle_query(query, embedding, vector_db, router):
+    # Chỉ embed lại sản phẩm có nội dung đổi; không xoá sản phẩm vắng mặt trong CSV (chạy catalog_sync.py --delete-missing)
+    df = pd.read_csv("hoanghamobile.csv")
+    print_summary(sync_catalog(df, embedding, vector_db, "products"))
     openai.api_key = os.getenv("OPENAI_API_KEY")
-    reflection = Reflection(openai)
+    pipeline = SpeculativePipeline(Reflection(openai), router, embedding, vector_db, limit=5)
+    semantic_cache = SemanticCache(threshold=0.95, ttl=3600)
+    return embedding, vector_db, router, pipeline, semantic_cache
 
-    rewritten_query = reflection.rewrite(st.session_state.messages, query)
-    route_result = router.guide(rewritten_query)
-    best_route = route_result[1]
+# Hàm xử lý truy vấn người dùng
+def handle_query(query, embedding, pipeline, semantic_cache):
+    # Rewrite chạy song song với định tuyến + truy vấn trên câu hỏi gốc
+    turn = pipeline.run(st.session_state.messages, query)
+    rewritten_query = turn["rewritten_query"]
+    best_route = turn["route"][1]
 
     st.chat_message("assistant").markdown(f"**[Định tuyến]:** `{best_route}`")
 
     if best_route == "uncertain":
-        return "🤔 Em chưa chắc chắn về câu hỏi này. Anh/chị có thể nói rõ hơn được không?"
-
-    elif best_route == "products":
-        query_embedding = embedding.encode(rewritten_query)
-        results = vector_db.query("products", query_embedding, limit=5)
-
-        context = ""
-        for r in results:
-            context += f"{r['information']}\n"
-
-        base_prompt = st.session_state.messages[0]["content"]
-        st.session_state.messages[0]["content"] = base_prompt + f"\nDữ liệu sản phẩm liên quan:\n{context}"
+        # Hỏi lại khách thay vì gọi LLM; lưu thành lượt trả lời để câu hỏi không bị treo trong lịch sử
+        clarification = "🤔 Em chưa chắc chắn về câu hỏi này. Anh/chị có thể nói rõ hơn được không?"
+        st.chat_message("assistant").markdown(clarification)
+        st.session_state.messages.append({"role": "assistant", "content": clarification})
+        return None
+
+    cached_reply = None
+    if best_route == "products":
+        results = turn["results"]
+        products_fingerprint = SemanticCache.fingerprint(results)
+        cached_reply = semantic_cache.lookup(turn["query_embedding"], products_fingerprint)
+
+        # Dựng lại system prompt: sản phẩm không trùng lặp, giới hạn theo ngân sách token
+        st.session_state.product_context.update(results)
+        st.session_state.messages[0]["content"] = st.session_state.product_context.system_prompt()
         st.session_state.messages.append({"role": "user", "content": rewritten_query})
 
     else:
         st.session_state.messages.append({"role": "user", "content": query})
 
-    # Gọi OpenAI chat dạng stream
-    response_stream = embedding.client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=st.session_state.messages,
-        stream=True
-    )
+    if cached_reply is not None:
+        # Câu hỏi tương tự đã được trả lời với cùng dữ liệu sản phẩm: stream lại từ cache
+        tokens = SemanticCache.stream(cached_reply)
+    else:
+        # Gọi OpenAI chat dạng stream
+        response_stream = embedding.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=st.session_state.messages,
+            stream=True
+        )
+        tokens = (
+            chunk.choices[0].delta.content
+            for chunk in response_stream
+            if chunk.choices and chunk.choices[0].delta.content
+        )
 
     assistant_reply = ""
     placeholder = st.empty()
-    for chunk in response_stream:
-        if chunk.choices and chunk.choices[0].delta.content:
-            token = chunk.choices[0].delta.content
-            assistant_reply += token
-            placeholder.markdown(assistant_reply + "▌")
+    for token in tokens:
+        assistant_reply += token
+        placeholder.markdown(assistant_reply + "▌")
 
     placeholder.markdown(assistant_reply)
     st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
+    if best_route == "products" and cached_reply is None:
+        semantic_cache.store(turn["query_embedding"], products_fingerprint, assistant_reply, query=rewritten_query)
+    cache_stats = semantic_cache.stats()
+    print(f"💾 Semantic cache: {cache_stats['hits']} hit / {cache_stats['misses']} miss")
     return None
 
 # ---------- Giao diện Streamlit ----------
@@ -113,7 +114,7 @@ st.set_page_config(page_title="Tư vấn Quang Đạt Phone", page_icon="📱",
 st.title("📞 Chatbot Tư vấn Quang Đạt Phone")
 
 init_session()
-embedding, vector_db, router = setup()
+embedding, vector_db, router, pipeline, semantic_cache = setup()
 
 for msg in st.session_state.messages[1:]:  # Bỏ system prompt
     with st.chat_message(msg["role"]):
@@ -125,4 +126,4 @@ if user_input:
         st.markdown(user_input)
     st.session_state.messages.append({"role": "user", "content": user_input})
 
-    handle_query(user_input, embedding, vector_db, router)
+    handle_query(user_input, embedding, pipeline, semantic_cache)
@@ -0,0 +1,92 @@
+"""
+Deterministic stand-ins for the network/model-backed clients, for offline benchmarks.
+
+- HashEncoder: feature-hashing bag-of-words embeddings, registered as the
+  "fake" provider of embeddings.Embeddings. Same text -> same vector in
+  every process, and texts sharing words get a positive cosine similarity,
+  so routing and retrieval still behave sensibly.
+- FakeChatClient: OpenAI-style chat.completions.create with a fixed latency.
+- FakeCrossEncoder: compute_score() like FlagReranker, scoring word overlap.
+"""
+import hashlib
+import re
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from embeddings import register_provider
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"\w+", str(text).lower())
+
+
+def _bucket(token: str, dim: int):
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+class HashEncoder:
+    """encode(text | list[str]) giống SentenceTransformer"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _tokens(text):
+            index, sign = _bucket(token, self.dim)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # Text rỗng: vector cố định thay vì vector 0 (tránh chia cho 0 khi chuẩn hoá)
+            vector[0] = 1.0
+            return vector
+        return vector / norm
+
+    def encode(self, docs):
+        if isinstance(docs, str):
+            return self._encode_one(docs)
+        return np.stack([self._encode_one(doc) for doc in docs]) if docs else np.empty((0, self.dim), dtype=np.float32)
+
+
+register_provider("fake", lambda model_name: HashEncoder(), batch_limits=(256, None))
+
+
+class FakeChatClient:
+    """llm_client giả: chat.completions.create(model, messages) ngủ `latency` giây rồi trả về `reply`"""
+
+    def __init__(self, latency: float = 0.0, reply: str = None):
+        """
+        :param reply: Nội dung trả về; None thì lặp lại message cuối cùng
+        """
+        self.latency = latency
+        self.reply = reply
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str = None, messages: list = None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = self.reply if self.reply is not None else messages[-1]["content"].strip().splitlines()[-1]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeCrossEncoder:
+    """Điểm = tỉ lệ từ của query xuất hiện trong passage; `latency_per_pair` giây mỗi cặp"""
+
+    def __init__(self, latency_per_pair: float = 0.0):
+        self.latency_per_pair = latency_per_pair
+
+    def compute_score(self, sentence_pairs: list, batch_size: int = 16, max_length: int = None, normalize: bool = False) -> list:
+        if self.latency_per_pair:
+            time.sleep(self.latency_per_pair * len(sentence_pairs))
+        scores = []
+        for query, passage in sentence_pairs:
+            query_tokens = set(_tokens(query))
+            overlap = len(query_tokens & set(_tokens(passage))) / len(query_tokens) if query_tokens else 0.0
+            scores.append(overlap if normalize else 4 * overlap - 2)
+        return scores
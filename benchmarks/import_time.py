@@ -0,0 +1,75 @@
+"""
+Startup cost of `import vector_db, embeddings` with lazy backends.
+
+    python benchmarks/import_time.py --repeat 5
+
+Each measurement runs in a fresh interpreter from the repo root, so
+nothing is already in sys.modules. "lazy" imports the two modules as they
+are now (drivers are imported only when a backend is selected); "eager"
+additionally imports every driver up front, which is what the modules
+used to do at load time. The difference is what a script using a single
+backend no longer pays.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DRIVERS = ["pymongo", "chromadb", "qdrant_client", "supabase", "openai", "sentence_transformers", "google.genai"]
+
+# Chỉ driver bên thứ ba được phép thiếu; lỗi import vector_db/embeddings phải làm benchmark dừng
+SNIPPET = """
+import importlib, json, sys, time
+missing = []
+start = time.perf_counter()
+for name in {drivers!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        missing.append(name)
+import vector_db, embeddings
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": len(sys.modules), "missing": missing}}))
+"""
+
+
+def measure(drivers: list) -> dict:
+    """Import `drivers` (bỏ qua driver chưa cài) rồi vector_db, embeddings trong một interpreter mới"""
+    process = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(drivers=drivers)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        sys.exit(f"❌ import vector_db, embeddings thất bại:\n{process.stderr}")
+    return json.loads(process.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian import vector_db và embeddings")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    scenarios = {
+        "lazy": [],
+        "eager": DRIVERS,
+    }
+    results = {}
+    for name, drivers in scenarios.items():
+        runs = [measure(drivers) for _ in range(args.repeat)]
+        results[name] = {
+            "median_ms": statistics.median(run["seconds"] for run in runs) * 1000,
+            "modules": runs[-1]["modules"],
+            "missing": runs[-1]["missing"],
+        }
+        print(f"⏱️ {name:<5} {results[name]['median_ms']:8.1f} ms | {results[name]['modules']} module")
+        if results[name]["missing"]:
+            print(f"   ⚠️ Chưa cài: {', '.join(results[name]['missing'])}")
+    print(f"🚀 Tiết kiệm: {results['eager']['median_ms'] - results['lazy']['median_ms']:.1f} ms mỗi lần khởi động")
+
+
+if __name__ == "__main__":
+    main()
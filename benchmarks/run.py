@@ -0,0 +1,225 @@
+"""
+Offline component benchmarks: no network, no model downloads.
+
+    python benchmarks/run.py --json results.json
+    python benchmarks/run.py --only router,vector_db --compare results.json
+
+Embeddings use the deterministic "fake" provider, the LLM and the reranker
+model are replaced by the fakes in benchmarks/fakes.py, and the vector DB
+is the local backend in a temporary directory. Every benchmark reports
+ops/s and p50/p95/p99 latency; --json writes them with the commit hash so
+runs on two commits can be diffed, and --compare prints the change
+against an earlier JSON file.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeChatClient, FakeCrossEncoder
+from embeddings import Embeddings
+from catalog_sync import build_combine_row
+from semantic_router.router import SemanticRouter
+from semantic_router.route import Route
+from semantic_router.samples import productsSample, chitchatSample
+from vector_db import VectorDatabase
+from reflection import Reflection
+from rerank import Reranker
+
+QUERIES = [
+    "Điện thoại Samsung nào dưới 5 triệu pin trâu?",
+    "iPhone 15 Pro Max còn màu titan tự nhiên không?",
+    "Chào shop, hôm nay trời đẹp nhỉ",
+    "Xiaomi Redmi Note 13 có sạc nhanh bao nhiêu W?",
+    "Shop có ship về Đà Nẵng không?",
+    "So sánh camera Oppo Reno11 và Vivo V30",
+]
+
+
+def measure(fn, repeat: int = 200, warmup: int = 5, ops: int = 1) -> dict:
+    """
+    Gọi fn() `repeat` lần, mỗi lần được tính là `ops` thao tác.
+
+    :return: ops_per_second, p50_ms, p95_ms, p99_ms, mean_ms (latency của một lần gọi fn)
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "ops_per_second": repeat * ops / latencies.sum(),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(latencies.mean() * 1000),
+        "repeat": repeat,
+        "ops_per_call": ops,
+    }
+
+
+def load_rows(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def bench_format(rows: list, repeat: int) -> dict:
+    return {
+        "build_combine_row": measure(lambda: [build_combine_row(row) for row in rows], repeat=max(repeat // 20, 3), warmup=1, ops=len(rows)),
+    }
+
+
+def bench_router(embedding, repeat: int) -> dict:
+    routes = [Route(name="products", samples=productsSample), Route(name="chitchat", samples=chitchatSample)]
+    router = SemanticRouter(embedding, routes=routes)
+    queries = iter(QUERIES * (repeat + 10))
+    return {
+        "router_construct": measure(lambda: SemanticRouter(embedding, routes=routes), repeat=max(repeat // 20, 3), warmup=1),
+        "router_guide": measure(lambda: router.guide(next(queries)), repeat=repeat),
+        "router_guide_many": measure(lambda: router.guide_many(QUERIES), repeat=repeat, ops=len(QUERIES)),
+    }
+
+
+def bench_vector_db(embedding, rows: list, repeat: int) -> dict:
+    documents = [
+        {"title": row["title"], "information": build_combine_row(row)}
+        for row in {row["title"]: row for row in rows}.values()
+    ]
+    vectors = embedding.encode_batch([document["information"] for document in documents])
+    for document, vector in zip(documents, vectors):
+        document["embedding"] = vector.tolist()
+    query_vectors = embedding.encode_batch(QUERIES)
+
+    results = {}
+    # Thư mục tạm bị xoá sau benchmark, kể cả khi có lỗi
+    with tempfile.TemporaryDirectory(prefix="bench_vector_db_") as path:
+        vector_db = VectorDatabase(db_type="local", path=path)
+        start = time.perf_counter()
+        vector_db.insert_documents("products", documents)
+        elapsed = time.perf_counter() - start
+        results["vector_db_insert"] = {"ops_per_second": len(documents) / elapsed, "seconds": elapsed, "documents": len(documents)}
+
+        queries = iter(list(query_vectors) * (repeat + 10))
+        results["vector_db_query"] = measure(lambda: vector_db.query("products", next(queries), limit=5), repeat=repeat)
+        results["vector_db_query_filter"] = measure(
+            lambda: vector_db.query("products", next(queries), limit=5, filter={"title": {"$ne": documents[0]["title"]}}),
+            repeat=repeat
+        )
+    return results
+
+
+def bench_reranker(rows: list, repeat: int, latency_per_pair: float) -> dict:
+    passages = [build_combine_row(row) for row in rows[:20]]
+    reranker = Reranker(model=FakeCrossEncoder(latency_per_pair=latency_per_pair), cache_size=0)
+    cached = Reranker(model=FakeCrossEncoder(latency_per_pair=latency_per_pair))
+    queries = iter(QUERIES * (repeat + 10))
+    return {
+        "reranker_score": measure(lambda: reranker(next(queries), passages), repeat=repeat, ops=len(passages)),
+        "reranker_score_cached": measure(lambda: cached(next(queries), passages), repeat=repeat, ops=len(passages)),
+    }
+
+
+def bench_reflection(repeat: int, latency: float) -> dict:
+    history = [
+        {"role": "user", "content": "Samsung Galaxy A05s giá bao nhiêu?"},
+        {"role": "assistant", "content": "Dạ, Samsung Galaxy A05s có giá 2.990.000 ₫ ạ."},
+    ]
+    follow_ups = iter([f"Còn màu đen không em? ({i})" for i in range(repeat + 10)])
+    reflection = Reflection(FakeChatClient(latency=latency, reply="Samsung Galaxy A05s còn màu đen không?"))
+    # Reflection in mỗi câu đã viết lại
+    with contextlib.redirect_stdout(io.StringIO()):
+        return {
+            "reflection_standalone": measure(lambda: reflection.rewrite(history, QUERIES[0]), repeat=repeat),
+            "reflection_llm": measure(lambda: reflection.rewrite(history, next(follow_ups)), repeat=max(repeat // 10, 3), warmup=1),
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict = None):
+    for name, stats in results.items():
+        line = f"📊 {name:<24} {stats['ops_per_second']:>12,.1f} ops/s"
+        if "p50_ms" in stats:
+            line += f" | p50 {stats['p50_ms']:8.3f} ms | p95 {stats['p95_ms']:8.3f} ms | p99 {stats['p99_ms']:8.3f} ms"
+        if baseline and name in baseline:
+            change = stats["ops_per_second"] / baseline[name]["ops_per_second"] - 1
+            line += f" | {change:+.1%} so với baseline"
+        print(line)
+
+
+BENCHMARKS = ("format", "router", "vector_db", "reranker", "reflection")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark các thành phần không cần mạng (provider giả)")
+    parser.add_argument("--csv", default=os.path.join(ROOT, "hoanghamobile.csv"))
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="Danh sách benchmark, cách nhau bởi dấu phẩy")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Độ trễ (giây) của chat client giả")
+    parser.add_argument("--rerank-latency", type=float, default=0.0, help="Độ trễ (giây) mỗi cặp của reranker giả")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", help="File JSON của lần chạy trước để so sánh")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Unknown benchmark: {', '.join(sorted(unknown))}")
+
+    rows = load_rows(args.csv)
+    embedding = Embeddings(model_name="fake", type="fake")
+    results = {}
+    if "format" in selected:
+        results.update(bench_format(rows, args.repeat))
+    if "router" in selected:
+        results.update(bench_router(embedding, args.repeat))
+    if "vector_db" in selected:
+        results.update(bench_vector_db(embedding, rows, args.repeat))
+    if "reranker" in selected:
+        results.update(bench_reranker(rows, args.repeat, args.rerank_latency))
+    if "reflection" in selected:
+        results.update(bench_reflection(args.repeat, args.llm_latency))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Đã ghi {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import base64
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+
+
+def fold_diacritics(text: str) -> str:
+    """'điện thoại' -> 'dien thoai'"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    return "".join(ch for ch in unicodedata.normalize("NFD", text) if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text, fold: bool = True) -> list:
+    """
+    Tách từ cho tiếng Việt: chuẩn hoá NFC, chữ thường, tách theo ký tự không phải chữ/số.
+    Giữ nguyên các token như "a05s", "6gb", "128gb".
+    """
+    text = unicodedata.normalize("NFC", str(text)).lower()
+    if fold:
+        text = fold_diacritics(text)
+    return re.findall(r"\w+", text)
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_postings(data: bytes):
+    """Yield (doc_id, tf) from delta + varint encoded postings"""
+    doc_id, value, shift, numbers = 0, 0, 0, []
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        numbers.append(value)
+        value, shift = 0, 0
+        if len(numbers) == 2:
+            doc_id += numbers[0]
+            yield doc_id, numbers[1]
+            numbers = []
+
+
+class BM25Index:
+    """
+    Embedded BM25 inverted index with the same interface as ElasticSearchDB.
+
+    Postings are stored per field as delta-encoded varint byte strings.
+    Documents are appended to a journal (documents.jsonl); the compiled
+    postings are snapshotted to index.json every `snapshot_every` inserts
+    and on close(), and journal entries newer than the snapshot are
+    replayed on load.
+    """
+
+    def __init__(self, path: str = "bm25_index", index_name: str = "products", field_boosts: dict = None,
+                 fold: bool = True, k1: float = 1.2, b: float = 0.75, snapshot_every: int = 1000):
+        """
+        :param field_boosts: Trọng số theo trường, mặc định {"title": 2.0, "information": 1.0}
+        :param fold: Bỏ dấu tiếng Việt khi index và tìm kiếm ("dien thoai" khớp "điện thoại")
+        :param snapshot_every: Ghi snapshot sau chừng này document mới, giới hạn phần journal phải replay khi load
+        """
+        self.path = os.path.join(path, index_name)
+        self.index_name = index_name
+        self.field_boosts = field_boosts or {"title": 2.0, "information": 1.0}
+        self.fold = fold
+        self.k1 = k1
+        self.b = b
+        self.snapshot_every = snapshot_every
+        self.create_index()
+
+    def create_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.documents = []
+        self.postings = {field: {} for field in self.field_boosts}
+        self.last_doc = {field: {} for field in self.field_boosts}
+        self.doc_freq = {field: Counter() for field in self.field_boosts}
+        self.lengths = {field: array("I") for field in self.field_boosts}
+        self.total_length = {field: 0 for field in self.field_boosts}
+        self.unsaved = 0
+        self._load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        journal = []
+        if os.path.exists(self._file("documents.jsonl")):
+            with open(self._file("documents.jsonl"), encoding="utf-8") as f:
+                journal = [json.loads(line) for line in f if line.strip()]
+
+        snapshot_count = 0
+        if os.path.exists(self._file("index.json")):
+            with open(self._file("index.json"), encoding="utf-8") as f:
+                snapshot = json.load(f)
+            same_settings = snapshot["fields"] == list(self.field_boosts) and snapshot["fold"] == self.fold
+            if same_settings and snapshot["doc_count"] <= len(journal):
+                snapshot_count = snapshot["doc_count"]
+                for field in self.field_boosts:
+                    data = snapshot["postings"][field]
+                    self.postings[field] = {term: bytearray(base64.b64decode(encoded)) for term, encoded in data.items()}
+                    self.last_doc[field] = snapshot["last_doc"][field]
+                    self.doc_freq[field] = Counter(snapshot["doc_freq"][field])
+                    self.lengths[field] = array("I", snapshot["lengths"][field])
+                    self.total_length[field] = sum(self.lengths[field])
+                self.documents = journal[:snapshot_count]
+
+        for document in journal[snapshot_count:]:
+            self._index(document)
+        if len(journal) > snapshot_count:
+            self.save()
+
+    def _index(self, document: dict):
+        doc_id = len(self.documents)
+        self.documents.append(document)
+        for field in self.field_boosts:
+            terms = Counter(tokenize(document.get(field, ""), self.fold))
+            self.lengths[field].append(sum(terms.values()))
+            self.total_length[field] += sum(terms.values())
+            for term, tf in terms.items():
+                # doc_id tăng dần nên chỉ cần nối thêm khoảng cách với doc trước
+                postings = self.postings[field].setdefault(term, bytearray())
+                _encode_varint(doc_id - self.last_doc[field].get(term, 0), postings)
+                _encode_varint(tf, postings)
+                self.last_doc[field][term] = doc_id
+                self.doc_freq[field][term] += 1
+
+    def insert_document(self, document):
+        document = {key: value for key, value in document.items() if key != "_id"}
+        with open(self._file("documents.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
+        self._index(document)
+        self.unsaved += 1
+        if self.unsaved >= self.snapshot_every:
+            self.save()
+
+    def close(self):
+        """Snapshot các document chưa lưu"""
+        if self.unsaved:
+            self.save()
+
+    def save(self):
+        snapshot = {
+            "doc_count": len(self.documents),
+            "fields": list(self.field_boosts),
+            "fold": self.fold,
+            "postings": {
+                field: {term: base64.b64encode(bytes(data)).decode("ascii") for term, data in postings.items()}
+                for field, postings in self.postings.items()
+            },
+            "last_doc": self.last_doc,
+            "doc_freq": {field: dict(counter) for field, counter in self.doc_freq.items()},
+            "lengths": {field: lengths.tolist() for field, lengths in self.lengths.items()},
+        }
+        tmp_file = self._file("index.json.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_file, self._file("index.json"))
+        self.unsaved = 0
+
+    def count_documents(self):
+        return len(self.documents)
+
+    def search(self, query, limit=5):
+        doc_count = len(self.documents)
+        if doc_count == 0:
+            return []
+        terms = set(tokenize(query, self.fold))
+        scores = defaultdict(float)
+        for field, boost in self.field_boosts.items():
+            avg_length = self.total_length[field] / doc_count or 1.0
+            lengths = self.lengths[field]
+            for term in terms:
+                postings = self.postings[field].get(term)
+                if postings is None:
+                    continue
+                df = self.doc_freq[field][term]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for doc_id, tf in _decode_postings(postings):
+                    norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / avg_length)
+                    scores[doc_id] += boost * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [
+            {
+                "title": self.documents[doc_id]["title"],
+                "information": self.documents[doc_id]["information"],
+                "score": score
+            }
+            for doc_id, score in top
+        ]
@@ -0,0 +1,135 @@
+"""
+Delta sync of the product catalog into the vector DB.
+
+    python catalog_sync.py --csv hoanghamobile.csv --db mongodb
+
+build_combine_row is the one text builder for every writer of the
+"products" collection: it is both the embedded text and the `information`
+shown to the LLM. Price and promotion stay in it, so questions about price
+or promotions still retrieve on them.
+
+Each stored product carries two fingerprints:
+- content_hash: hash of that text and of the embedding model. Only a
+  change here costs an embedding call.
+- metadata_hash: hash of the typed attributes from product_attributes.py
+  (price, RAM, ...) stored alongside for filtering. A change here alone
+  (e.g. a parser fix) is patched in place, keeping the stored vector.
+Products that disappeared from the CSV are only deleted with
+delete_missing=True (--delete-missing), so a partial CSV never removes
+products by accident.
+"""
+from embeddings import Embeddings
+from vector_db import VectorDatabase
+from product_attributes import extract_attributes
+import pandas as pd
+import argparse
+import hashlib
+import json
+
+# Hàm ghép thông tin sản phẩm (dùng chung cho mọi nơi ghi vào collection "products")
+def build_combine_row(row):
+    combine = f"Tên sản phẩm: {row['title']}\n"
+    combine += f"Mô tả: {row['product_specs']}\n"
+    combine += f"Giá: {row['current_price']}\n"
+    combine += f"Ưu đãi: {row['product_promotion']}\n"
+    combine += f"Màu sắc: {row['color_options']}\n"
+    return combine
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def build_document(row, model_name: str) -> dict:
+    """Document (chưa có embedding) kèm text cần embed và hai fingerprint"""
+    information = build_combine_row(row)
+    attributes = extract_attributes(row)
+    return {
+        "title": row['title'],
+        "information": information,
+        "content_hash": _hash(f"{model_name}\n{information}"),
+        "metadata_hash": _hash(json.dumps(attributes, sort_keys=True, ensure_ascii=False)),
+        **attributes,
+        "embedding_text": information,
+    }
+
+def _stored(document: dict) -> dict:
+    return {key: value for key, value in document.items() if key != "embedding_text"}
+
+def plan_sync(documents: list, stored: dict, delete_missing: bool = False) -> dict:
+    """
+    So sánh document từ CSV với fingerprint đã lưu.
+
+    :return: dict insert / reembed / patch (list document), delete (list title), skipped (int)
+    """
+    plan = {"insert": [], "reembed": [], "patch": [], "delete": [], "skipped": 0}
+    for document in documents:
+        fingerprint = stored.get(document["title"])
+        if fingerprint is None:
+            plan["insert"].append(document)
+        elif fingerprint.get("content_hash") != document["content_hash"]:
+            plan["reembed"].append(document)
+        elif fingerprint.get("metadata_hash") != document["metadata_hash"]:
+            plan["patch"].append(document)
+        else:
+            plan["skipped"] += 1
+    if delete_missing:
+        titles = {document["title"] for document in documents}
+        plan["delete"] = [title for title in stored if title not in titles]
+    return plan
+
+def sync_catalog(df, embedding, vector_db, collection_name: str = "products", delete_missing: bool = False, dry_run: bool = False) -> dict:
+    """
+    Đồng bộ DataFrame catalog vào vector DB, chỉ embed lại những gì thực sự đổi.
+
+    :param delete_missing: Xoá sản phẩm không còn trong df; chỉ bật khi df là catalog đầy đủ
+    """
+    # Title trùng trong CSV: giữ dòng cuối
+    df = df.drop_duplicates(subset="title", keep="last")
+    documents = [build_document(row, embedding.model_name) for _, row in df.iterrows()]
+    stored = vector_db.document_fingerprints(collection_name, ["content_hash", "metadata_hash"])
+    plan = plan_sync(documents, stored, delete_missing)
+
+    if not dry_run:
+        to_embed = plan["insert"] + plan["reembed"]
+        vectors = embedding.encode_batch([document["embedding_text"] for document in to_embed]) if to_embed else []
+        for document, vector in zip(to_embed, vectors):
+            document["embedding"] = vector.tolist()
+
+        vector_db.insert_documents(collection_name, [_stored(document) for document in plan["insert"]])
+        vector_db.update_documents(collection_name, [_stored(document) for document in plan["reembed"]])
+        vector_db.update_documents(collection_name, [_stored(document) for document in plan["patch"]])
+        vector_db.delete_documents(collection_name, plan["delete"])
+
+    return {
+        "inserted": len(plan["insert"]),
+        "reembedded": len(plan["reembed"]),
+        "patched": len(plan["patch"]),
+        "deleted": len(plan["delete"]),
+        "skipped": plan["skipped"],
+    }
+
+def print_summary(summary: dict):
+    print(
+        f"🔄 Sync: {summary['inserted']} thêm mới, {summary['reembedded'] + summary['patched']} cập nhật "
+        f"({summary['reembedded']} embed lại, {summary['patched']} chỉ sửa thông tin), "
+        f"{summary['deleted']} xoá, {summary['skipped']} không đổi"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Đồng bộ catalog sản phẩm (chỉ phần thay đổi) vào vector DB")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--db", default="mongodb", help="mongodb, chromadb, qdrant, supabase hoặc local")
+    parser.add_argument("--collection", default="products")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--provider", default="openai", help="openai, gemini hoặc sentence_transformers")
+    parser.add_argument("--delete-missing", action="store_true", help="Xoá sản phẩm không còn trong CSV (CSV phải là catalog đầy đủ)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ in số lượng, không ghi gì")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    embedding = Embeddings(model_name=args.model, type=args.provider, cache="embedding_cache.sqlite")
+    vector_db = VectorDatabase(db_type=args.db)
+    summary = sync_catalog(df, embedding, vector_db, args.collection, delete_missing=args.delete_missing, dry_run=args.dry_run)
+    print_summary(summary)
+
+if __name__ == "__main__":
+    main()
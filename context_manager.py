@@ -0,0 +1,98 @@
+from embeddings import estimate_tokens
+
+
+class ProductContext:
+    """
+    Product documents currently shown to the LLM in the system prompt.
+
+    Documents are de-duplicated by title and kept under a token budget.
+    When the budget is exceeded the least recently retrieved documents go
+    first, ties broken by lowest relevance. The system message is rebuilt
+    from scratch each turn: base prompt + documents in first-seen order, so
+    the same conversation always yields the same prompt.
+    """
+
+    def __init__(self, base_prompt: str, max_tokens: int = 3000, max_documents: int = 15):
+        """
+        :param base_prompt: System prompt gốc (không kèm dữ liệu sản phẩm)
+        :param max_tokens: Ngân sách token cho phần dữ liệu sản phẩm (ước lượng bằng estimate_tokens)
+        :param max_documents: Số sản phẩm tối đa giữ trong prompt
+        """
+        self.base_prompt = base_prompt
+        self.max_tokens = max_tokens
+        self.max_documents = max_documents
+        self.documents = {}
+        self.turn = 0
+        self.duplicates = 0
+        self.evicted = 0
+
+    def update(self, results: list):
+        """
+        Thêm kết quả truy vấn của lượt hiện tại.
+
+        :param results: List dict có title, information và score (tuỳ chọn, mặc định 1/rank)
+        """
+        self.turn += 1
+        for rank, doc in enumerate(results, start=1):
+            title = doc["title"]
+            relevance = float(doc.get("score", 1.0 / rank))
+            if title in self.documents:
+                self.duplicates += 1
+                entry = self.documents[title]
+                entry["information"] = doc["information"]
+                entry["tokens"] = estimate_tokens(doc["information"])
+                entry["relevance"] = max(entry["relevance"], relevance) if entry["last_turn"] == self.turn else relevance
+                entry["last_turn"] = self.turn
+            else:
+                self.documents[title] = {
+                    "information": doc["information"],
+                    "tokens": estimate_tokens(doc["information"]),
+                    "relevance": relevance,
+                    "last_turn": self.turn,
+                }
+        self._evict()
+
+    def _evict(self):
+        # Cũ nhất trước, cùng lượt thì ít liên quan nhất trước
+        order = sorted(self.documents, key=lambda title: (self.documents[title]["last_turn"], self.documents[title]["relevance"]))
+        total = self.tokens()
+        for title in order:
+            if total <= self.max_tokens and len(self.documents) <= self.max_documents:
+                break
+            # Luôn giữ lại ít nhất một sản phẩm của lượt hiện tại
+            if len(self.documents) == 1:
+                break
+            total -= self.documents.pop(title)["tokens"]
+            self.evicted += 1
+
+    def tokens(self) -> int:
+        return sum(entry["tokens"] for entry in self.documents.values())
+
+    def system_prompt(self) -> str:
+        if not self.documents:
+            return self.base_prompt
+        context = "\n".join(entry["information"] for entry in self.documents.values())
+        return self.base_prompt + f"\nDữ liệu sản phẩm liên quan:\n{context}"
+
+    def state(self) -> dict:
+        """JSON-serializable state (không gồm base_prompt), dùng để lưu phiên"""
+        return {"documents": self.documents, "turn": self.turn, "duplicates": self.duplicates, "evicted": self.evicted}
+
+    def load_state(self, state: dict):
+        self.documents = dict(state.get("documents", {}))
+        self.turn = state.get("turn", 0)
+        self.duplicates = state.get("duplicates", 0)
+        self.evicted = state.get("evicted", 0)
+        return self
+
+    def clear(self):
+        self.documents = {}
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.documents),
+            "tokens": self.tokens(),
+            "max_tokens": self.max_tokens,
+            "duplicates": self.duplicates,
+            "evicted": self.evicted,
+        }
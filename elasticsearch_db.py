@@ -14,6 +14,9 @@ class ElasticSearchDB:
     def insert_document(self, document):
         self.es.index(index=self.index_name, document=document)
 
+    def close(self):
+        self.es.close()
+
     def count_documents(self):
         return self.es.count(index=self.index_name)['count']
 
@@ -30,7 +33,8 @@ class ElasticSearchDB:
         results = [
             {
                 "title": hit["_source"]["title"],
-                "information": hit["_source"]["information"]
+                "information": hit["_source"]["information"],
+                "score": hit["_score"]
             }
             for hit in response["hits"]["hits"]
         ]
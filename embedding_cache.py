@@ -0,0 +1,174 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Two-tier content-addressed cache for embeddings.
+
+    Tier 1 is an in-memory LRU, tier 2 an optional SQLite file that survives
+    restarts. Entries are keyed by (provider type, model_name, sha256(text)).
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_memory_items: int = 10_000, max_disk_items: int = 200_000):
+        """
+        :param path: SQLite file, None để chỉ dùng cache trong RAM
+        :param max_memory_items: Số vector tối đa giữ trong LRU
+        :param max_disk_items: Số vector tối đa trên đĩa, cũ nhất bị xoá trước
+        """
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self._memory = OrderedDict()
+        # last_access của các lần đọc từ đĩa, chỉ ghi xuống cùng put_many (nơi duy nhất evict)
+        # để đường đọc không giữ write lock của SQLite
+        self._pending_access = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    provider TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (provider, model, text_hash)
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+            self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, provider: str, model: str, texts: list) -> list:
+        """Return one float32 vector (or None on miss) per text, in input order."""
+        hashes = [self.text_hash(text) for text in texts]
+        results = [None] * len(texts)
+        disk_lookup = {}
+
+        with self._lock:
+            for i, text_hash in enumerate(hashes):
+                key = (provider, model, text_hash)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                else:
+                    disk_lookup.setdefault(text_hash, []).append(i)
+
+            if disk_lookup and self._conn is not None:
+                found = self._read_disk(provider, model, list(disk_lookup))
+                for text_hash, vector in found.items():
+                    for i in disk_lookup[text_hash]:
+                        results[i] = vector
+                    self._remember((provider, model, text_hash), vector)
+                    self.disk_hits += len(disk_lookup[text_hash])
+
+            found_count = sum(result is not None for result in results)
+            self.hits += found_count
+            self.misses += len(texts) - found_count
+        return results
+
+    def put_many(self, provider: str, model: str, texts: list, vectors) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                text_hash = self.text_hash(text)
+                self._remember((provider, model, text_hash), vector)
+                rows.append((provider, model, text_hash, vector.tobytes(), now))
+
+            if rows and self._conn is not None:
+                self._flush_access()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (provider, model, text_hash, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            disk_items = self._disk_count()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": disk_items,
+            "evictions": self.evictions,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._pending_access.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM embeddings")
+                self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, provider, model, hashes):
+        """Chỉ SELECT; last_access được ghi sau bởi _flush_access"""
+        found = {}
+        now = time.time()
+        # SQLite giới hạn số tham số trong một câu lệnh, chia nhỏ danh sách hash
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE provider = ? AND model = ? AND text_hash IN ({placeholders})",
+                [provider, model, *chunk]
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+                self._pending_access[(provider, model, text_hash)] = now
+        return found
+
+    def _flush_access(self):
+        if not self._pending_access:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_access = ? WHERE provider = ? AND model = ? AND text_hash = ?",
+            [(last_access, *key) for key, last_access in self._pending_access.items()]
+        )
+        self._pending_access.clear()
+
+    def _evict_disk(self):
+        overflow = self._disk_count() - self.max_disk_items
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+
+    def _disk_count(self):
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -1,25 +1,71 @@
-from openai import OpenAI
 import os
+import numpy as np
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from google import genai
+from embedding_cache import EmbeddingCache
 
 load_dotenv()
 
+# (max items, max tokens) per request for each provider.
+# OpenAI: 2048 inputs / 300k tokens per call, Gemini batchEmbedContents: 100 inputs.
+BATCH_LIMITS = {
+    "openai": (2048, 300_000),
+    "gemini": (100, 100_000),
+    "sentence_transformers": (64, None),
+}
+
+# SDK của từng provider chỉ được import khi provider đó được chọn (sentence_transformers kéo theo torch)
+def _openai_client(model_name):
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def _sentence_transformers_client(model_name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def _gemini_client(model_name):
+    from google import genai
+    return genai.Client(
+        api_key=os.getenv("GEMINI_API_KEY")
+    )
+
+PROVIDERS = {
+    "openai": _openai_client,
+    "sentence_transformers": _sentence_transformers_client,
+    "gemini": _gemini_client,
+}
+
+def register_provider(name, factory, batch_limits=(64, None)):
+    """
+    Register an embedding provider usable as Embeddings(model_name, type=name).
+
+    :param factory: factory(model_name) -> client có encode(text | list[str]) giống SentenceTransformer
+    :param batch_limits: (max items, max tokens) mỗi lần gọi encode
+    """
+    PROVIDERS[name] = factory
+    BATCH_LIMITS[name] = batch_limits
+
+def estimate_tokens(text):
+    """Cheap upper-bound token estimate (tiếng Việt có dấu tốn nhiều token hơn tiếng Anh)."""
+    return len(text.encode("utf-8")) // 2 + 1
+
 class Embeddings:
-    def __init__(self, model_name, type):
+    def __init__(self, model_name, type, cache=None):
+        """
+        :param cache: EmbeddingCache (hoặc đường dẫn file SQLite) để tái sử dụng vector đã tính
+        """
         self.model_name = model_name
         self.type = type
-        if type == "openai":
-            self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        elif type == "sentence_transformers":
-            self.client = SentenceTransformer(model_name)
-        elif type == "gemini":
-            self.client = genai.Client(
-                api_key=os.getenv("GEMINI_API_KEY")
-            )
+        if isinstance(cache, str):
+            cache = EmbeddingCache(path=cache)
+        self.cache = cache
+        if type not in PROVIDERS:
+            raise ValueError(f"Unsupported embedding provider: {type}")
+        self.client = PROVIDERS[type](model_name)
 
     def encode(self, doc):
+        if self.cache is not None and isinstance(doc, str):
+            vector = self.encode_batch([doc])[0]
+            return vector if self.type == "sentence_transformers" else vector.tolist()
         if self.type == "openai":
             return self.client.embeddings.create(
                 input=doc,
@@ -32,3 +78,74 @@ class Embeddings:
                 model=self.model_name,
                 contents=doc
             ).embeddings[0].values
+        else:
+            return self.client.encode(doc)
+
+    def encode_batch(self, docs, batch_size=None, max_tokens=None):
+        """
+        Encode a list of texts with as few provider calls as possible.
+
+        :param docs: List of texts
+        :param batch_size: Max items per request (default: provider limit)
+        :param max_tokens: Max estimated tokens per request (default: provider limit)
+        :return: float32 ndarray of shape (len(docs), dim), in input order
+        """
+        docs = [str(doc) for doc in docs]
+        if not docs:
+            return np.empty((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._encode_uncached(docs, batch_size, max_tokens)
+
+        vectors = self.cache.get_many(self.type, self.model_name, docs)
+        # Chỉ gọi provider cho các văn bản chưa có trong cache (bỏ trùng lặp)
+        missing = list(dict.fromkeys(doc for doc, vector in zip(docs, vectors) if vector is None))
+        if missing:
+            fresh = self._encode_uncached(missing, batch_size, max_tokens)
+            self.cache.put_many(self.type, self.model_name, missing, fresh)
+            fresh_by_doc = dict(zip(missing, fresh))
+            vectors = [fresh_by_doc[doc] if vector is None else vector for doc, vector in zip(docs, vectors)]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _encode_uncached(self, docs, batch_size=None, max_tokens=None):
+        vectors = []
+        for chunk in self._chunks(docs, batch_size, max_tokens):
+            vectors.extend(self._encode_chunk(chunk))
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _chunks(self, docs, batch_size=None, max_tokens=None):
+        default_size, default_tokens = BATCH_LIMITS.get(self.type, (1, None))
+        batch_size = batch_size or default_size
+        max_tokens = max_tokens or default_tokens
+
+        chunk, chunk_tokens = [], 0
+        for doc in docs:
+            tokens = estimate_tokens(doc)
+            too_many_tokens = max_tokens is not None and chunk_tokens + tokens > max_tokens
+            if chunk and (len(chunk) >= batch_size or too_many_tokens):
+                yield chunk
+                chunk, chunk_tokens = [], 0
+            chunk.append(doc)
+            chunk_tokens += tokens
+        if chunk:
+            yield chunk
+
+    def _encode_chunk(self, chunk):
+        if self.type == "openai":
+            data = self.client.embeddings.create(
+                input=chunk,
+                model=self.model_name
+            ).data
+            # API trả về kèm index, sắp xếp lại cho chắc chắn đúng thứ tự input
+            return [item.embedding for item in sorted(data, key=lambda item: item.index)]
+        elif self.type == "sentence_transformers":
+            return list(self.client.encode(chunk, batch_size=len(chunk), convert_to_numpy=True))
+        elif self.type == "gemini":
+            return [
+                embedding.values
+                for embedding in self.client.models.embed_content(
+                    model=self.model_name,
+                    contents=chunk
+                ).embeddings
+            ]
+        else:
+            return list(self.client.encode(chunk))
@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HybridRetriever:
+    """
+    Dense (VectorDatabase) + keyword (ElasticSearchDB) retrieval.
+
+    Both searches run concurrently and are fused either with reciprocal rank
+    fusion ("rrf") or a weighted sum of min-max normalized scores
+    ("weighted"). Results are de-duplicated by title.
+    """
+
+    def __init__(self, embedding, vector_db, keyword_db, collection_name: str = "products", fusion: str = "rrf",
+                 rrf_k: int = 60, dense_weight: float = 1.0, keyword_weight: float = 1.0, candidates: int = 10):
+        """
+        :param keyword_db: Đối tượng có search(query, limit) như ElasticSearchDB
+        :param candidates: Số kết quả lấy từ mỗi nguồn trước khi gộp
+        """
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unsupported fusion: {fusion}")
+        self.embedding = embedding
+        self.vector_db = vector_db
+        self.keyword_db = keyword_db
+        self.collection_name = collection_name
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.weights = {"dense": dense_weight, "keyword": keyword_weight}
+        self.candidates = candidates
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self._stats = {
+            source: {"calls": 0, "latency": 0.0, "returned": 0, "contributed": 0, "only_source": 0}
+            for source in self.weights
+        }
+
+    def _dense(self, query):
+        start = time.perf_counter()
+        query_embedding = self.embedding.encode(query)
+        results = self.vector_db.query(self.collection_name, query_embedding, limit=self.candidates)
+        return results, time.perf_counter() - start
+
+    def _keyword(self, query):
+        start = time.perf_counter()
+        results = self.keyword_db.search(query, limit=self.candidates)
+        return results, time.perf_counter() - start
+
+    def search(self, query: str, limit: int = 5) -> list:
+        futures = {
+            "dense": self.executor.submit(self._dense, query),
+            "keyword": self.executor.submit(self._keyword, query),
+        }
+        ranked = {}
+        for source, future in futures.items():
+            results, latency = future.result()
+            ranked[source] = results
+            self._stats[source]["calls"] += 1
+            self._stats[source]["latency"] += latency
+            self._stats[source]["returned"] += len(results)
+
+        fused = self._fuse(ranked)[:limit]
+        for doc in fused:
+            for source in doc["sources"]:
+                self._stats[source]["contributed"] += 1
+            if len(doc["sources"]) == 1:
+                self._stats[doc["sources"][0]]["only_source"] += 1
+        return fused
+
+    def _fuse(self, ranked: dict) -> list:
+        merged = {}
+        for source, results in ranked.items():
+            weight = self.weights[source]
+            contributions = self._contributions(results)
+            for doc, contribution in zip(results, contributions):
+                title = doc["title"]
+                if title not in merged:
+                    merged[title] = {
+                        "title": title,
+                        "information": doc["information"],
+                        "score": 0.0,
+                        "sources": [],
+                    }
+                # Một nguồn có thể trả về cùng title nhiều lần, chỉ tính lần xếp hạng cao nhất
+                if source not in merged[title]["sources"]:
+                    merged[title]["score"] += weight * contribution
+                    merged[title]["sources"].append(source)
+        return sorted(merged.values(), key=lambda doc: doc["score"], reverse=True)
+
+    def _contributions(self, results: list) -> list:
+        if self.fusion == "rrf":
+            return [1.0 / (self.rrf_k + rank) for rank in range(1, len(results) + 1)]
+        # Backend không trả score (vd: Chroma) thì dùng 1/rank thay thế
+        scores = [doc.get("score", 1.0 / rank) for rank, doc in enumerate(results, start=1)]
+        if not scores:
+            return []
+        low, high = min(scores), max(scores)
+        if high == low:
+            return [1.0] * len(scores)
+        return [(score - low) / (high - low) for score in scores]
+
+    def stats(self) -> dict:
+        report = {}
+        for source, stats in self._stats.items():
+            calls = stats["calls"] or 1
+            report[source] = {
+                **stats,
+                "avg_latency": stats["latency"] / calls,
+                "weight": self.weights[source],
+            }
+        return report
@@ -1,54 +1,36 @@
 from embeddings import Embeddings
 from vector_db import VectorDatabase
+from catalog_sync import sync_catalog, print_summary
 import pandas as pd
 from semantic_router.route import Route
 from semantic_router.router import SemanticRouter
 from semantic_router.samples import productsSample
 from semantic_router.samples import chitchatSample
 from reflection import Reflection
+from context_manager import ProductContext
 import openai
 import os
 from rerank import Reranker
 
+# Collection Mongo riêng, cần vector index "vector_index" với numDimensions 3072
+COLLECTION = "products_large"
 
-def build_combine_row(row):
-    combine = f"Tên sản phẩm: {row['title']}\n"
-    combine += f"Mô tả: {row['product_specs']}\n"
-    combine += f"Giá: {row['current_price']}\n"
-    combine += f"Ưu đãi: {row['product_promotion']}\n"
-    combine += f"Màu sắc: {row['color_options']}\n"
-    return combine
 
 def main():
     df = pd.read_csv("hoanghamobile.csv")
-    df['information'] = df.apply(build_combine_row, axis=1)
 
     vector_db = VectorDatabase(db_type="mongodb")
-    embedding = Embeddings(model_name="text-embedding-3-large", type="openai")
+    embedding = Embeddings(model_name="text-embedding-3-large", type="openai", cache="embedding_cache.sqlite")
     reranker = Reranker()
     routes = [
         Route(name="products", samples=productsSample),
         Route(name="chitchat", samples=chitchatSample)
     ]
-    router = SemanticRouter(embedding, routes)
-    if vector_db.count_documents("products") == 0:
-        print("🔄 Chưa có dữ liệu trong DB, bắt đầu chèn dữ liệu...")
-        for index, row in df.iterrows():
-            title = row['title']
-            doc = row['information']
-            embedding_vector = embedding.encode(doc)
-            vector_db.insert_document(
-                collection_name="products",
-                document={
-                    "title": title,
-                    "embedding": embedding_vector,
-                    "information": doc
-                }
-            )
-            print(f"Inserted document {index + 1}/{len(df)}: {title}")
-        print("✅ Đã chèn xong toàn bộ dữ liệu.")
-    else:
-        print("✅ Dữ liệu đã tồn tại trong MongoDB, bỏ qua bước insert.")
+    router = SemanticRouter(embedding, routes, aggregation="topk", top_k=5, margin=0.4)
+    # Cùng cách ghép với app.py, server.py, ingest.py (catalog_sync.build_document), nhưng
+    # text-embedding-3-large (3072 chiều) cần collection riêng: dùng chung "products" với
+    # text-embedding-3-small sẽ làm mỗi script embed lại toàn bộ catalog của script kia
+    print_summary(sync_catalog(df, embedding, vector_db, COLLECTION))
 
     print("Hệ thống đã sẵn sàng. Bạn có thể hỏi về sản phẩm. Gõ 'quit' để thoát.")
     
@@ -63,6 +45,8 @@ Hãy ưu tiên ngắn gọn, dễ hiểu. Nếu khách hỏi gợi ý sản ph
 Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình."""
         }
     ]
+    # Dữ liệu sản phẩm trong system prompt: không trùng lặp, giới hạn theo ngân sách token
+    product_context = ProductContext(messages[0]["content"])
 
     while True:
         query = input("💬 Câu hỏi của bạn: ")
@@ -99,7 +83,7 @@ Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình
             query_embedding = embedding.encode(hyde_generated)
 
             # Truy vấn DB như trước
-            results = vector_db.query("products", query_embedding, limit=7)
+            results = vector_db.query(COLLECTION, query_embedding, limit=7)
             cnt = 0
             print("📄 Kết quả tìm kiếm trước khi rerank:")
             for result in results:
@@ -119,11 +103,18 @@ Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình
                 print(passage)
                 print("-" * 50)
 
-            context = "\n".join(ranked_passages[:5])
-
-            system_content = messages[0]["content"]  # Lấy prompt ban đầu
-            new_system_content = system_content + f"\nDữ liệu sản phẩm liên quan:\n{context}"
-            messages[0]["content"] = new_system_content  # Gộp context vào system để giữ continuity
+            rerank_stats = reranker.stats()
+            print(f"⚡ Rerank cache hit rate: {rerank_stats['hit_rate']:.0%}, {rerank_stats['avg_batch_latency'] * 1000:.0f} ms/batch")
+
+            # Giữ title để khử trùng lặp, điểm rerank làm độ liên quan
+            by_information = {result["information"]: result for result in results}
+            ranked_results = [
+                {"title": by_information[passage]["title"], "information": passage, "score": score}
+                for score, passage in zip(scores[:5], ranked_passages[:5])
+            ]
+            # Dựng lại system prompt từ prompt gốc + các sản phẩm đang giữ
+            product_context.update(ranked_results)
+            messages[0]["content"] = product_context.system_prompt()
 
             messages.append({"role": "user", "content": query})
         else:
@@ -0,0 +1,250 @@
+"""
+Streaming catalog ingest: parse -> format -> embed -> write.
+
+    python ingest.py --csv hoanghamobile.csv --db mongodb --embed-workers 4
+
+The CSV is read in chunks and each chunk flows through the four stages.
+Stages are connected by bounded queues (backpressure: a slow writer stalls
+the embedder instead of buffering the whole catalog) and each stage runs
+its own number of worker threads, so embedding API calls overlap with DB
+writes. Finished chunks are recorded in a checkpoint file; re-running the
+command skips them. Writes are upserts keyed by vector_db.document_id, so a
+chunk written but not yet checkpointed is overwritten, not duplicated, and
+--overwrite can skip the existence lookup altogether. Documents carry the same fingerprints as
+catalog_sync.py, so later refreshes can run as a delta sync.
+"""
+from embeddings import Embeddings
+from vector_db import VectorDatabase
+from catalog_sync import build_document
+import pandas as pd
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+_DONE = object()
+
+class Checkpoint:
+    """Chunk đã ghi xong, lưu dạng JSON; chỉ dùng lại khi cùng file CSV và chunk_size"""
+
+    def __init__(self, path: str, csv_path: str, chunk_size: int, resume: bool = True):
+        self.path = path
+        self.key = {"csv": os.path.abspath(csv_path), "chunk_size": chunk_size}
+        self.done = set()
+        self._lock = threading.Lock()
+        if resume and path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("key") == self.key:
+                self.done = set(state["done"])
+
+    def mark(self, index: int):
+        with self._lock:
+            self.done.add(index)
+            if self.path:
+                tmp_file = self.path + ".tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump({"key": self.key, "done": sorted(self.done)}, f)
+                os.replace(tmp_file, self.path)
+
+class Stage:
+    """
+    Worker threads applying fn to every item of a queue.
+
+    fn returns the item for the next stage, or None to drop it. The stop
+    sentinel is passed on to the next stage once every worker has finished.
+    """
+
+    def __init__(self, name: str, fn, workers: int, inbox: queue.Queue, outbox: queue.Queue = None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.items = 0
+        self.rows = 0
+        self.busy = 0.0
+        self.error = None
+        self._running = workers
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+
+    def start(self, abort: threading.Event):
+        self.abort = abort
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                # Trả sentinel lại cho các worker khác của stage này
+                self.inbox.put(_DONE)
+                break
+            if self.abort.is_set():
+                # Vẫn đọc hết queue để stage phía trước không bị chặn
+                continue
+            start = time.perf_counter()
+            try:
+                result = self.fn(item)
+            except Exception as e:
+                self.error = e
+                self.abort.set()
+                continue
+            with self._lock:
+                self.busy += time.perf_counter() - start
+                self.items += 1
+                self.rows += item["rows"]
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.outbox is not None:
+            self.outbox.put(_DONE)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def report(self, wall_time: float) -> dict:
+        return {
+            "workers": self.workers,
+            "chunks": self.items,
+            "rows": self.rows,
+            "busy_seconds": self.busy,
+            # Throughput khi stage chạy (theo thời gian bận của một worker) và trên toàn bộ thời gian chạy
+            "rows_per_busy_second": self.rows / self.busy * self.workers if self.busy else 0.0,
+            "rows_per_second": self.rows / wall_time if wall_time else 0.0,
+        }
+
+class IngestPipeline:
+    def __init__(self, embedding, vector_db, collection_name: str = "products", chunk_size: int = 64,
+                 format_workers: int = 1, embed_workers: int = 2, write_workers: int = 1, queue_size: int = 4,
+                 checkpoint: Checkpoint = None, skip_existing: bool = True):
+        """
+        :param chunk_size: Số dòng CSV mỗi chunk (= một lần gọi embed và một lần ghi DB)
+        :param queue_size: Số chunk tối đa chờ giữa hai stage
+        :param skip_existing: Bỏ qua title đã có trong DB (vd: chạy lại khi mất checkpoint)
+        """
+        self.embedding = embedding
+        self.vector_db = vector_db
+        self.collection_name = collection_name
+        self.chunk_size = chunk_size
+        self.workers = {"format": format_workers, "embed": embed_workers, "write": write_workers}
+        self.queue_size = queue_size
+        self.checkpoint = checkpoint
+        self.skip_existing = skip_existing
+        self.skipped_rows = 0
+        self._lock = threading.Lock()
+
+    def _format(self, chunk):
+        df = chunk["df"]
+        if self.skip_existing:
+            existing = self.vector_db.existing_titles(self.collection_name, df['title'].tolist())
+            with self._lock:
+                self.skipped_rows += int(df['title'].isin(existing).sum())
+            df = df[~df['title'].isin(existing)]
+        if df.empty:
+            if self.checkpoint is not None:
+                self.checkpoint.mark(chunk["index"])
+            return None
+        documents = [build_document(row, self.embedding.model_name) for _, row in df.iterrows()]
+        return {"index": chunk["index"], "rows": len(documents), "documents": documents}
+
+    def _embed(self, chunk):
+        vectors = self.embedding.encode_batch([document.pop("embedding_text") for document in chunk["documents"]])
+        for document, vector in zip(chunk["documents"], vectors):
+            document["embedding"] = vector.tolist()
+        return chunk
+
+    def _write(self, chunk):
+        self.vector_db.insert_documents(self.collection_name, chunk["documents"])
+        if self.checkpoint is not None:
+            self.checkpoint.mark(chunk["index"])
+        return None
+
+    def run(self, csv_path: str) -> dict:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(3)]
+        stages = [
+            Stage("format", self._format, self.workers["format"], queues[0], queues[1]),
+            Stage("embed", self._embed, self.workers["embed"], queues[1], queues[2]),
+            Stage("write", self._write, self.workers["write"], queues[2]),
+        ]
+        abort = threading.Event()
+        for stage in stages:
+            stage.start(abort)
+
+        # Stage parse chạy trên thread chính: đọc CSV theo chunk, không load cả file
+        start = time.perf_counter()
+        parse = {"chunks": 0, "rows": 0, "busy_seconds": 0.0, "resumed_chunks": 0}
+        reader = pd.read_csv(csv_path, chunksize=self.chunk_size)
+        while not abort.is_set():
+            parse_start = time.perf_counter()
+            df = next(reader, None)
+            parse["busy_seconds"] += time.perf_counter() - parse_start
+            if df is None:
+                break
+            index = parse["chunks"]
+            parse["chunks"] += 1
+            parse["rows"] += len(df)
+            if self.checkpoint is not None and index in self.checkpoint.done:
+                parse["resumed_chunks"] += 1
+                continue
+            queues[0].put({"index": index, "rows": len(df), "df": df})
+        queues[0].put(_DONE)
+        for stage in stages:
+            stage.join()
+        wall_time = time.perf_counter() - start
+
+        for stage in stages:
+            if stage.error is not None:
+                raise RuntimeError(f"Stage '{stage.name}' failed") from stage.error
+
+        parse["rows_per_second"] = parse["rows"] / wall_time if wall_time else 0.0
+        report = {"parse": parse}
+        report.update({stage.name: stage.report(wall_time) for stage in stages})
+        return {"wall_time": wall_time, "skipped_rows": self.skipped_rows, "stages": report}
+
+def main():
+    parser = argparse.ArgumentParser(description="Nạp catalog sản phẩm vào vector DB theo kiểu streaming")
+    parser.add_argument("--csv", default="hoanghamobile.csv")
+    parser.add_argument("--db", default="mongodb", help="mongodb, chromadb, qdrant, supabase hoặc local")
+    parser.add_argument("--collection", default="products")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--provider", default="openai", help="openai, gemini hoặc sentence_transformers")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--format-workers", type=int, default=1)
+    parser.add_argument("--embed-workers", type=int, default=2)
+    parser.add_argument("--write-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--checkpoint", default="ingest_checkpoint.json")
+    parser.add_argument("--no-resume", action="store_true", help="Bỏ qua checkpoint cũ, nạp lại từ đầu")
+    parser.add_argument("--overwrite", action="store_true", help="Không kiểm tra title đã có, embed và upsert lại tất cả")
+    args = parser.parse_args()
+
+    embedding = Embeddings(model_name=args.model, type=args.provider, cache="embedding_cache.sqlite")
+    vector_db = VectorDatabase(db_type=args.db)
+    checkpoint = Checkpoint(args.checkpoint, args.csv, args.chunk_size, resume=not args.no_resume)
+    pipeline = IngestPipeline(
+        embedding, vector_db,
+        collection_name=args.collection,
+        chunk_size=args.chunk_size,
+        format_workers=args.format_workers,
+        embed_workers=args.embed_workers,
+        write_workers=args.write_workers,
+        queue_size=args.queue_size,
+        checkpoint=checkpoint,
+        skip_existing=not args.overwrite,
+    )
+    report = pipeline.run(args.csv)
+
+    print(f"✅ Ingest xong trong {report['wall_time']:.1f}s, bỏ qua {report['skipped_rows']} sản phẩm đã có.")
+    for name, stats in report["stages"].items():
+        print(f"📊 {name:<7} {stats['rows']:>6} dòng | {stats['busy_seconds']:.2f}s bận | {stats['rows_per_second']:.1f} dòng/s")
+
+if __name__ == "__main__":
+    main()
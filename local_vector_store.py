@@ -0,0 +1,366 @@
+import json
+import os
+
+import numpy as np
+
+from ann_index import IVFIndex, brute_force_search, top_k
+from metadata_filter import matches, normalize_filter
+from quantization import QUANTIZERS, ProductQuantizer
+
+
+class LocalCollection:
+    """
+    One collection of the local store.
+
+    Embeddings are L2-normalized and kept in a single contiguous float32
+    matrix; on disk they are an append-only raw file (vectors.f32) next to
+    documents.jsonl, so inserts never rewrite what is already stored.
+    With index="ivf" queries go through an IVFIndex once the collection
+    holds at least `min_index_size` vectors; smaller ones stay brute force.
+    With quantization="int8" or "pq" only the compact codes live in RAM:
+    they pick `rescore` candidates, which are then re-scored exactly with
+    the float32 vectors memory-mapped from disk.
+    """
+
+    def __init__(self, path: str, mmap: bool = True, index: str = None, nprobe: int = 16, n_lists: int = None, min_index_size: int = 10_000,
+                 quantization: str = None, pq_m: int = 96, rescore: int = 50, min_quantize_size: int = 1_000):
+        self.path = path
+        # Khi lượng tử hoá, vector float32 chỉ nằm trên đĩa (memmap) để tiết kiệm RAM
+        self.mmap = mmap or quantization is not None
+        self.index_type = index
+        self.nprobe = nprobe
+        self.n_lists = n_lists
+        self.min_index_size = min_index_size
+        if quantization is not None and quantization not in QUANTIZERS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.quantization = quantization
+        self.pq_m = pq_m
+        self.rescore = rescore
+        self.min_quantize_size = min_quantize_size
+        self.quantizer = None
+        self.codes = None
+        self.dim = None
+        self.documents = []
+        self.titles = {}
+        self._buffer = np.empty((0, 0), dtype=np.float32)
+        self._size = 0
+        self.index = None
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        if self.index_type == "ivf":
+            self.index = IVFIndex.load(path)
+            if self.index is not None:
+                self.index.nprobe = nprobe
+                if len(self.index) > self._size:
+                    self.index = None  # index lệch với dữ liệu, train lại
+            self._update_index()
+        elif self.index_type is not None:
+            raise ValueError(f"Unsupported index type: {self.index_type}")
+        if self.quantization is not None:
+            if self.dim is not None:
+                self._check_dim(self.dim)
+            self._load_quantizer()
+            self._update_quantizer()
+
+    def _check_dim(self, dim: int):
+        if self.quantization == "pq" and dim % self.pq_m != 0:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by pq_m={self.pq_m}")
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_file = self._file("meta.json")
+        if not os.path.exists(meta_file):
+            return
+        with open(meta_file, encoding="utf-8") as f:
+            self.dim = json.load(f)["dim"]
+        with open(self._file("documents.jsonl"), encoding="utf-8") as f:
+            documents = [json.loads(line) for line in f if line.strip()]
+
+        vector_count = os.path.getsize(self._file("vectors.f32")) // (4 * self.dim)
+        # Nếu lần ghi trước bị ngắt giữa chừng, chỉ giữ phần hai file khớp nhau
+        count = min(vector_count, len(documents))
+        if count == 0:
+            return
+        if self.mmap:
+            self._buffer = self._memmap(count)
+        else:
+            self._buffer = np.fromfile(self._file("vectors.f32"), dtype=np.float32, count=count * self.dim).reshape(count, self.dim)
+        self._size = count
+        self.documents = documents[:count]
+        self.titles = {document["title"]: i for i, document in enumerate(self.documents)}
+
+    def _memmap(self, count: int) -> np.ndarray:
+        return np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        # memmap chỉ đọc: chuyển sang buffer trong RAM khi cần ghi thêm
+        if needed <= len(self._buffer) and not isinstance(self._buffer, np.memmap):
+            return
+        capacity = max(needed, 2 * len(self._buffer), 64)
+        buffer = np.empty((capacity, self.dim), dtype=np.float32)
+        if self._size:
+            buffer[:self._size] = self.vectors
+        self._buffer = buffer
+
+    def insert(self, documents: list):
+        """Upsert by title: a stored document with the same title is replaced"""
+        if not documents:
+            return
+        documents = list({document["title"]: document for document in documents}.values())
+        matrix = np.asarray([document["embedding"] for document in documents], dtype=np.float32)
+        # Kiểm tra trước khi xoá / ghi gì: lỗi sau khi đã append sẽ để lại collection không load lại được
+        if self.dim is None:
+            self._check_dim(matrix.shape[1])
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match collection dimension {self.dim}")
+        replaced = [document["title"] for document in documents if document["title"] in self.titles]
+        if replaced:
+            self.delete(replaced)
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+            with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim}, f)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+
+        if self.quantization is None:
+            self._reserve(len(matrix))
+            self._buffer[self._size:self._size + len(matrix)] = matrix
+        with open(self._file("vectors.f32"), "ab") as f:
+            f.write(matrix.tobytes())
+        with open(self._file("documents.jsonl"), "a", encoding="utf-8") as f:
+            for document in documents:
+                stored = {key: value for key, value in document.items() if key not in ("embedding", "_id")}
+                f.write(json.dumps(stored, ensure_ascii=False) + "\n")
+                self.titles[stored["title"]] = self._size
+                self.documents.append(stored)
+                self._size += 1
+        if self.quantization is not None:
+            self._buffer = self._memmap(self._size)
+            self._update_quantizer()
+        self._update_index()
+
+    def _write_documents(self):
+        tmp_file = self._file("documents.jsonl.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for document in self.documents:
+                f.write(json.dumps(document, ensure_ascii=False) + "\n")
+        os.replace(tmp_file, self._file("documents.jsonl"))
+
+    def update(self, documents: list):
+        """
+        Patch stored fields by title. Documents carrying an embedding are
+        deleted and re-inserted; the others are updated in place.
+        """
+        reinsert = []
+        patched = False
+        for document in documents:
+            if document["title"] not in self.titles:
+                continue
+            if "embedding" in document:
+                stored = self.documents[self.titles[document["title"]]]
+                reinsert.append({**stored, **document})
+            else:
+                self.documents[self.titles[document["title"]]].update(
+                    {key: value for key, value in document.items() if key != "_id"}
+                )
+                patched = True
+        if patched:
+            self._write_documents()
+        if reinsert:
+            self.delete([document["title"] for document in reinsert])
+            self.insert(reinsert)
+
+    def delete(self, titles: list) -> int:
+        """Remove documents by title and compact the files (rewrite without them)"""
+        drop = {self.titles[title] for title in titles if title in self.titles}
+        if not drop:
+            return 0
+        keep = np.asarray([i for i in range(self._size) if i not in drop], dtype=np.int64)
+        vectors = np.ascontiguousarray(self.vectors[keep]) if len(keep) else np.empty((0, self.dim), dtype=np.float32)
+        tmp_file = self._file("vectors.f32.tmp")
+        with open(tmp_file, "wb") as f:
+            f.write(vectors.tobytes())
+        os.replace(tmp_file, self._file("vectors.f32"))
+        self.documents = [self.documents[i] for i in keep]
+        self._write_documents()
+
+        self._size = len(keep)
+        self.titles = {document["title"]: i for i, document in enumerate(self.documents)}
+        self._buffer = self._memmap(self._size) if self.mmap and self._size else vectors
+        if self.codes is not None:
+            self.codes = self.codes[keep]
+            self._write_codes(self.codes)
+        if self.index is not None:
+            # Giữ nguyên centroid, chỉ bỏ các dòng đã xoá khỏi danh sách gán cụm (ghi lại cùng lúc nén vectors.f32)
+            self.index.assignments = self.index.assignments[keep]
+            self.index._lists = None
+            self.index.save_assignments(self.path)
+        return len(drop)
+
+    def _load_quantizer(self):
+        if not os.path.exists(self._file("quantizer.npz")):
+            return
+        state = dict(np.load(self._file("quantizer.npz")))
+        if str(state.pop("kind")) != self.quantization:
+            return  # đổi kiểu lượng tử hoá: train lại
+        self.quantizer = QUANTIZERS[self.quantization]()
+        self.quantizer.load_state(state)
+        codes_file = self._file("codes.bin")
+        if not os.path.exists(codes_file):
+            return  # codes được mã hoá lại trong _update_quantizer
+        # Kiểu và độ rộng code phụ thuộc quantizer (int8: dim x int8, pq: m x uint8)
+        layout = self.quantizer.encode(np.zeros((1, self.dim), dtype=np.float32))
+        row_bytes = layout.itemsize * layout.shape[1]
+        count = min(os.path.getsize(codes_file) // row_bytes, self._size)
+        # Bỏ phần thừa của lần ghi bị ngắt để các lần nối sau khớp với vectors.f32
+        os.truncate(codes_file, count * row_bytes)
+        self.codes = np.fromfile(codes_file, dtype=layout.dtype, count=count * layout.shape[1]).reshape(count, layout.shape[1])
+
+    def _write_codes(self, codes: np.ndarray, append: bool = False):
+        with open(self._file("codes.bin"), "ab" if append else "wb") as f:
+            f.write(np.ascontiguousarray(codes).tobytes())
+
+    def _update_quantizer(self):
+        if self._size == 0:
+            return
+        if self.quantizer is None:
+            if self._size < self.min_quantize_size:
+                return
+            self.quantizer = ProductQuantizer(m=self.pq_m) if self.quantization == "pq" else QUANTIZERS[self.quantization]()
+            self.quantizer.train(self.vectors)
+            np.savez(self._file("quantizer.npz"), kind=self.quantization, **self.quantizer.state())
+        if self.codes is None:
+            self.codes = self.quantizer.encode(self.vectors)
+            self._write_codes(self.codes)
+        elif len(self.codes) < self._size:
+            # Chỉ mã hoá và nối thêm các dòng mới, như vectors.f32
+            new_codes = self.quantizer.encode(self.vectors[len(self.codes):])
+            self.codes = np.concatenate([self.codes, new_codes])
+            self._write_codes(new_codes, append=True)
+
+    def _update_index(self):
+        if self.index_type != "ivf" or self._size == 0:
+            return
+        trained = False
+        if self.index is None:
+            if self._size < self.min_index_size:
+                return
+            self.index = IVFIndex(n_lists=self.n_lists, nprobe=self.nprobe)
+            self.index.train(self.vectors)
+            trained = True
+        if len(self.index) < self._size:
+            start = len(self.index)
+            self.index.add(self.vectors[start:])
+            if trained:
+                self.index.save(self.path)
+            else:
+                # Chỉ nối gán cụm của các vector mới, như vectors.f32
+                self.index.save_assignments(self.path, start)
+
+    def query(self, query_vector, limit: int = 5, filter: dict = None) -> list:
+        if self._size == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        query = query / max(np.linalg.norm(query), 1e-12)
+
+        allowed = None
+        if filter:
+            conditions = normalize_filter(filter)
+            allowed = np.fromiter((matches(document, conditions) for document in self.documents), dtype=bool, count=self._size)
+            if not allowed.any():
+                return []
+        candidates = self._candidates(query, limit, allowed)
+
+        if self.quantizer is not None:
+            top, scores = self._quantized_search(query, limit, candidates)
+        elif candidates is None:
+            top, scores = brute_force_search(self.vectors, query, limit)
+        else:
+            top, scores = brute_force_search(self.vectors[candidates], query, limit)
+            top = candidates[top]
+        return [{**self.documents[i], "score": float(score)} for i, score in zip(top, scores)]
+
+    def _candidates(self, query: np.ndarray, limit: int, allowed: np.ndarray = None):
+        """Row ids worth scoring (IVF probe and/or filter), None = every row"""
+        probed = self.index.probe(query) if self.index is not None else None
+        if allowed is None:
+            return probed
+        filtered = np.flatnonzero(allowed)
+        if probed is None:
+            return filtered
+        probed = probed[allowed[probed]]
+        # Filter chặt làm các cụm được quét thiếu ứng viên: quét mọi dòng thoả filter
+        return probed if len(probed) >= limit else filtered
+
+    def _quantized_search(self, query: np.ndarray, limit: int, candidates: np.ndarray = None):
+        if candidates is None:
+            candidates = np.arange(self._size)
+        approx = self.quantizer.score(self.codes[candidates], query)
+        shortlist = np.sort(candidates[top_k(approx, max(limit, self.rescore))])
+        # Chấm lại chính xác bằng float32 (đọc từ memmap) cho nhóm ứng viên nhỏ
+        top, scores = brute_force_search(self.vectors[shortlist], query, limit)
+        return shortlist[top], scores
+
+
+class LocalVectorStore:
+    """In-process vector database, no external service required"""
+
+    def __init__(self, path: str = "local_vector_db", mmap: bool = True, **index_options):
+        """
+        :param path: Thư mục lưu dữ liệu, mỗi collection một thư mục con
+        :param mmap: Memory-map ma trận embedding khi load thay vì đọc hết vào RAM
+        :param index_options: index="ivf", nprobe, quantization="int8"|"pq", rescore, ... (xem LocalCollection)
+        """
+        self.path = path
+        self.mmap = mmap
+        self.index_options = index_options
+        self.collections = {}
+
+    def _collection(self, collection_name: str) -> LocalCollection:
+        if collection_name not in self.collections:
+            self.collections[collection_name] = LocalCollection(
+                os.path.join(self.path, collection_name),
+                mmap=self.mmap,
+                **self.index_options
+            )
+        return self.collections[collection_name]
+
+    def insert_document(self, collection_name: str, document: dict):
+        self._collection(collection_name).insert([document])
+
+    def insert_documents(self, collection_name: str, documents: list):
+        self._collection(collection_name).insert(list(documents))
+
+    def query(self, collection_name: str, query_vector, limit: int = 5, filter: dict = None) -> list:
+        return self._collection(collection_name).query(query_vector, limit, filter)
+
+    def document_exists(self, collection_name: str, filter_query: dict) -> bool:
+        return filter_query["title"] in self._collection(collection_name).titles
+
+    def existing_titles(self, collection_name: str, titles: list) -> set:
+        stored = self._collection(collection_name).titles
+        return {title for title in titles if title in stored}
+
+    def update_documents(self, collection_name: str, documents: list):
+        self._collection(collection_name).update(list(documents))
+
+    def delete_documents(self, collection_name: str, titles: list) -> int:
+        return self._collection(collection_name).delete(list(titles))
+
+    def document_fingerprints(self, collection_name: str, fields: list) -> dict:
+        return {
+            document["title"]: {field: document.get(field) for field in fields}
+            for document in self._collection(collection_name).documents
+        }
+
+    def count_documents(self, collection_name: str) -> int:
+        return len(self._collection(collection_name).documents)
@@ -0,0 +1,147 @@
+"""
+Backend-neutral metadata filters for VectorDatabase.query.
+
+A filter is a dict of field -> value or field -> {operator: value}, all
+conditions ANDed, using a Mongo-like subset:
+
+    {"brand": "samsung", "price": {"$gte": 3_000_000, "$lte": 5_000_000}, "has_promotion": True}
+
+Operators: $eq, $ne, $gt, $gte, $lt, $lte, $in. Range operators take a
+number, the others non-null scalars (null is rejected, not translated).
+A missing (or null) field never matches, except for $ne, which matches it
+on every backend but Chroma: Chroma has no "key is missing" condition, so
+there $ne only matches records that have the field.
+"""
+import re
+
+OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in")
+_RANGE = {"$gt": "gt", "$gte": "gte", "$lt": "lt", "$lte": "lte"}
+# Không nhận None: Chroma và Qdrant không có dạng so sánh với null
+_SCALARS = (str, int, float, bool)
+
+
+def _is_number(value) -> bool:
+    # bool là int trong Python nhưng không phải một cận hợp lệ
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def normalize_filter(filter: dict) -> list:
+    """-> [(field, operator, value), ...]; báo lỗi sớm (ValueError) với toán tử hoặc giá trị không hỗ trợ"""
+    if filter is not None and not isinstance(filter, dict):
+        raise ValueError("filter must be an object")
+    conditions = []
+    for field, condition in (filter or {}).items():
+        if field.startswith("$"):
+            raise ValueError(f"Unsupported top-level operator: {field}")
+        # Tên trường được ghép thẳng vào chuỗi điều kiện của PostgREST (apply_postgrest)
+        if not re.fullmatch(r"[A-Za-z_]\w*", field):
+            raise ValueError(f"Invalid field name: {field!r}")
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {operator}")
+            if operator == "$in":
+                if not isinstance(value, (list, tuple, set)):
+                    raise ValueError(f"$in expects a list for field '{field}'")
+                if not all(isinstance(item, _SCALARS) for item in value):
+                    raise ValueError(f"$in expects a list of non-null scalars for field '{field}'")
+            elif operator in _RANGE:
+                if not _is_number(value):
+                    raise ValueError(f"{operator} expects a number for field '{field}'")
+            elif not isinstance(value, _SCALARS):
+                raise ValueError(f"{operator} expects a non-null scalar for field '{field}'")
+            conditions.append((field, operator, list(value) if operator == "$in" else value))
+    return conditions
+
+
+def matches(document: dict, filter) -> bool:
+    """
+    Đánh giá filter trên một document (backend local).
+
+    :param filter: dict filter, hoặc kết quả normalize_filter khi lọc nhiều document với cùng filter
+    """
+    for field, operator, value in filter if isinstance(filter, list) else normalize_filter(filter):
+        stored = document.get(field)
+        if operator == "$ne":
+            if stored == value:
+                return False
+            continue
+        if stored is None:
+            return False
+        if operator == "$eq" and stored != value:
+            return False
+        if operator == "$in" and stored not in value:
+            return False
+        if operator in _RANGE:
+            # Trường không phải số (vd: title) thì không thoả điều kiện khoảng, giống Mongo
+            if not _is_number(stored):
+                return False
+            if operator == "$gt" and not stored > value:
+                return False
+            if operator == "$gte" and not stored >= value:
+                return False
+            if operator == "$lt" and not stored < value:
+                return False
+            if operator == "$lte" and not stored <= value:
+                return False
+    return True
+
+
+def to_mongo(filter: dict) -> dict:
+    """$vectorSearch.filter; các trường phải được khai báo type "filter" trong vector index"""
+    clauses = [{field: {operator: value}} for field, operator, value in normalize_filter(filter)]
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def to_chroma(filter: dict):
+    """where của Chroma; $and cần ít nhất hai điều kiện"""
+    clauses = [{field: {operator: value}} for field, operator, value in normalize_filter(filter)]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def to_qdrant(filter: dict):
+    from qdrant_client import models
+
+    must, must_not = [], []
+    ranges = {}
+    for field, operator, value in normalize_filter(filter):
+        if operator == "$eq":
+            must.append(models.FieldCondition(key=field, match=models.MatchValue(value=value)))
+        elif operator == "$ne":
+            must_not.append(models.FieldCondition(key=field, match=models.MatchValue(value=value)))
+        elif operator == "$in":
+            must.append(models.FieldCondition(key=field, match=models.MatchAny(any=value)))
+        else:
+            # Gộp các cận của cùng một trường vào một Range
+            ranges.setdefault(field, {})[_RANGE[operator]] = value
+    for field, bounds in ranges.items():
+        must.append(models.FieldCondition(key=field, range=models.Range(**bounds)))
+    if not must and not must_not:
+        return None
+    return models.Filter(must=must or None, must_not=must_not or None)
+
+
+def _postgrest_literal(value) -> str:
+    """Giá trị trong or=(...) của PostgREST; chuỗi luôn được đặt trong nháy kép"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return repr(value)
+
+
+def apply_postgrest(builder, filter: dict):
+    """Thêm điều kiện WHERE vào query builder của supabase-py (select hoặc rpc)"""
+    methods = {"$eq": "eq", "$gt": "gt", "$gte": "gte", "$lt": "lt", "$lte": "lte", "$in": "in_"}
+    for field, operator, value in normalize_filter(filter):
+        if operator == "$ne":
+            # neq loại cả dòng NULL; thêm is.null để giống Mongo / local (trường thiếu thoả $ne)
+            builder = builder.or_(f"{field}.neq.{_postgrest_literal(value)},{field}.is.null")
+        else:
+            builder = getattr(builder, methods[operator])(field, value)
+    return builder
@@ -0,0 +1,126 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def is_near_noop(original: str, rewritten: str, threshold: float = 0.9) -> bool:
+    """True when the rewrite barely changed the query (so speculative work is still valid)"""
+    return SequenceMatcher(None, normalize_query(original), normalize_query(rewritten)).ratio() >= threshold
+
+
+class SpeculativePipeline:
+    """
+    Per-turn pipeline: rewrite -> route -> embed -> retrieve.
+
+    Routing and retrieval start on the raw query in the pool while
+    Reflection.rewrite runs on the calling thread. If the rewrite turns out
+    to be a near no-op the speculative results are kept; otherwise the
+    speculative branch is told to stop before its next step (embed, vector
+    query) and the stages re-run on the rewritten query. Each turn holds at
+    most one pool worker; when the pool is saturated the speculative branch
+    is still queued at decision time, gets cancelled and runs inline.
+    """
+
+    def __init__(self, reflection, router, embedding, vector_db, collection_name: str = "products", limit: int = 5, similarity_threshold: float = 0.9, max_workers: int = 4):
+        """
+        :param max_workers: Số nhánh suy đoán chạy song song = số lượt hội thoại đồng thời được tăng tốc
+        """
+        self.reflection = reflection
+        self.router = router
+        self.embedding = embedding
+        self.vector_db = vector_db
+        self.collection_name = collection_name
+        self.limit = limit
+        self.similarity_threshold = similarity_threshold
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.turns = 0
+        self.speculative_hits = 0
+        self.speculative_aborted = 0
+        self.total_saved = 0.0
+        self._lock = threading.Lock()
+
+    def _rewrite(self, messages, query):
+        start = time.perf_counter()
+        rewritten = self.reflection.rewrite(messages, query)
+        return rewritten, time.perf_counter() - start
+
+    def _route_and_retrieve(self, query, cancelled: threading.Event = None):
+        """cancelled được set -> dừng trước bước kế tiếp và trả về None"""
+        timings = {}
+        start = time.perf_counter()
+        route = self.router.guide(query)
+        timings["route"] = time.perf_counter() - start
+
+        results, query_embedding = [], None
+        if route[1] == "products":
+            if cancelled is not None and cancelled.is_set():
+                return None
+            start = time.perf_counter()
+            query_embedding = self.embedding.encode(query)
+            timings["embed"] = time.perf_counter() - start
+            if cancelled is not None and cancelled.is_set():
+                return None
+            start = time.perf_counter()
+            results = self.vector_db.query(self.collection_name, query_embedding, limit=self.limit)
+            timings["retrieve"] = time.perf_counter() - start
+        return route, results, query_embedding, timings
+
+    def run(self, messages, query) -> dict:
+        """
+        :return: dict gồm rewritten_query, route, results, query_embedding, speculative_hit, timings, wall_time, saved_time
+        """
+        start = time.perf_counter()
+        cancelled = threading.Event()
+        speculative_future = self.executor.submit(self._route_and_retrieve, query, cancelled)
+        # Rewrite chạy ngay trên thread gọi: mỗi lượt chỉ giữ tối đa một worker của pool
+        rewritten_query, rewrite_time = self._rewrite(messages, query)
+
+        speculative_hit = is_near_noop(query, rewritten_query, self.similarity_threshold)
+        if speculative_hit and not speculative_future.cancel():
+            route, results, query_embedding, timings = speculative_future.result()
+        else:
+            # Miss: nhánh suy đoán dừng trước bước embed / truy vấn DB kế tiếp.
+            # Hit nhưng nhánh suy đoán vẫn đang xếp hàng (pool bận): đã huỷ, chạy luôn ở đây.
+            cancelled.set()
+            aborted = not speculative_future.cancel() and not speculative_future.done()
+            with self._lock:
+                self.speculative_aborted += aborted
+            route, results, query_embedding, timings = self._route_and_retrieve(query if speculative_hit else rewritten_query)
+        timings["rewrite"] = rewrite_time
+
+        wall_time = time.perf_counter() - start
+        # Thời gian nếu chạy tuần tự như trước = tổng thời gian các bước
+        saved_time = max(0.0, sum(timings.values()) - wall_time)
+
+        with self._lock:
+            self.turns += 1
+            self.speculative_hits += speculative_hit
+            self.total_saved += saved_time
+        print(f"⚡ Pipeline: speculative {'hit' if speculative_hit else 'miss'}, {wall_time * 1000:.0f} ms, saved {saved_time * 1000:.0f} ms")
+        return {
+            "rewritten_query": rewritten_query,
+            "route": route,
+            "results": results,
+            "query_embedding": query_embedding,
+            "speculative_hit": speculative_hit,
+            "timings": timings,
+            "wall_time": wall_time,
+            "saved_time": saved_time,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "speculative_hits": self.speculative_hits,
+            "hit_rate": self.speculative_hits / self.turns if self.turns else 0.0,
+            # Nhánh suy đoán đang chạy lúc miss, được báo dừng giữa chừng
+            "speculative_aborted": self.speculative_aborted,
+            "total_saved": self.total_saved,
+            "avg_saved": self.total_saved / self.turns if self.turns else 0.0,
+        }
@@ -0,0 +1,245 @@
+import re
+import time
+
+import numpy as np
+
+from metadata_filter import OPERATORS
+
+NUMERIC_ATTRIBUTES = ("price", "ram_gb", "storage_gb", "battery_mah", "screen_inch")
+CATEGORICAL_ATTRIBUTES = ("brand", "has_promotion")
+ATTRIBUTES = NUMERIC_ATTRIBUTES + CATEGORICAL_ATTRIBUTES
+
+_UNIT_GB = {"TB": 1024.0, "GB": 1.0, "G": 1.0, "MB": 1 / 1024}
+# Khoảng hợp lệ (GB); ngoài khoảng này coi như dữ liệu nhập sai
+RAM_RANGE_GB = (1 / 1024, 32.0)
+STORAGE_RANGE_GB = (1 / 1024, 2048.0)
+
+
+def _missing(value) -> bool:
+    # pandas đọc ô trống thành NaN
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def parse_price(text):
+    """'1,590,000 ₫' -> 1590000; 'Giá: Liên hệ' hoặc ô trống -> None"""
+    if _missing(text):
+        return None
+    digits = re.sub(r"[^\d]", "", str(text))
+    return int(digits) if digits and int(digits) > 0 else None
+
+
+def parse_specs(text) -> dict:
+    """'RAM:\\n8GB<br> Bộ nhớ trong:\\n128 GB<br>' -> {"RAM": "8GB", "Bộ nhớ trong": "128 GB"}"""
+    specs = {}
+    if _missing(text):
+        return specs
+    for part in str(text).split("<br>"):
+        if ":" in part:
+            key, value = part.split(":", 1)
+            specs[key.strip()] = value.strip()
+    return specs
+
+
+def parse_size_gb(text, low: float = None, high: float = None):
+    """
+    '8GB + 8GB (RAM ảo)' -> 8.0, '64MB |' -> 0.0625, '1TB' -> 1024.0; chỉ lấy giá trị đầu tiên.
+    'Không', 'Đang cập nhật' hoặc giá trị ngoài [low, high] -> None
+    """
+    if _missing(text) or not text:
+        return None
+    match = re.search(r"(\d+(?:[.,]\d+)?)\s*(TB|GB|MB|G)\b", str(text).upper().replace("MB3", "MB"))
+    if match is None:
+        return None
+    size = float(match.group(1).replace(",", ".")) * _UNIT_GB[match.group(2)]
+    if (low is not None and size < low) or (high is not None and size > high):
+        return None
+    return size
+
+
+def parse_battery(text):
+    """'5,000mAh (typ)' -> 5000, '5200mAh/6000mAh' -> 5200"""
+    if not text:
+        return None
+    match = re.search(r"(\d[\d,.]*)\s*mAh", str(text), re.IGNORECASE)
+    return int(re.sub(r"[,.]", "", match.group(1))) if match else None
+
+
+def parse_screen(text):
+    """'6.78 inch', '6.78’’' -> 6.78"""
+    if not text:
+        return None
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(?:inch|in\b|''|’’|\")", str(text), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+def parse_brand(title):
+    """'điện thoại xiaomi redmi 12 ...' -> 'xiaomi'"""
+    if _missing(title):
+        return None
+    words = re.sub(r"^\s*((điện thoại|di động)\s+)+", "", str(title).lower()).split()
+    return words[0] if words else None
+
+
+def extract_attributes(row) -> dict:
+    """Thuộc tính có kiểu từ một dòng CSV; giá trị không đọc được là None"""
+    specs = parse_specs(row["product_specs"])
+    promotion = row["product_promotion"]
+    ram_gb = parse_size_gb(specs.get("RAM"), *RAM_RANGE_GB)
+    storage_gb = parse_size_gb(specs.get("Bộ nhớ trong"), *STORAGE_RANGE_GB)
+    if ram_gb is not None and storage_gb is not None and ram_gb > storage_gb:
+        # RAM lớn hơn bộ nhớ trong là nhập sai (vd: máy phím 24 MB ghi RAM 16GB); bộ nhớ trong thường đúng
+        ram_gb = None
+    return {
+        "price": parse_price(row["current_price"]),
+        "ram_gb": ram_gb,
+        "storage_gb": storage_gb,
+        "battery_mah": parse_battery(specs.get("Dung lượng pin")),
+        "screen_inch": parse_screen(specs.get("Kích thước màn hình")),
+        "brand": parse_brand(row["title"]),
+        "has_promotion": not _missing(promotion) and bool(str(promotion).strip()),
+    }
+
+
+class AttributeIndex:
+    """
+    Column store over product attributes.
+
+    Numeric attributes are float64 columns (NaN = unknown) with a sorted
+    permutation each, so range filters are two searchsorted calls and
+    top-N by an attribute walks the permutation from one end. Categorical
+    attributes keep a value -> row ids map. Filters use the Mongo-like
+    subset {"price": {"$lte": 5_000_000}, "ram_gb": {"$gte": 8}, "brand": "samsung"}.
+    """
+
+    def __init__(self, documents: list):
+        """
+        :param documents: List dict có "title" và các thuộc tính (vd: kết quả extract_attributes)
+        """
+        self.documents = list(documents)
+        self.titles = [document["title"] for document in self.documents]
+        self.size = len(self.documents)
+        self.columns = {}
+        self.sorted_ids = {}
+        self.sorted_values = {}
+        for name in NUMERIC_ATTRIBUTES:
+            column = np.array(
+                [np.nan if _missing(document.get(name)) else float(document[name]) for document in self.documents],
+                dtype=np.float64
+            )
+            known = np.flatnonzero(~np.isnan(column))
+            order = known[np.argsort(column[known], kind="stable")]
+            self.columns[name] = column
+            self.sorted_ids[name] = order
+            self.sorted_values[name] = column[order]
+        self.categories = {}
+        for name in CATEGORICAL_ATTRIBUTES:
+            groups = {}
+            for i, document in enumerate(self.documents):
+                if not _missing(document.get(name)):
+                    groups.setdefault(document[name], []).append(i)
+            self.categories[name] = {value: np.asarray(ids, dtype=np.int64) for value, ids in groups.items()}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: iterable các dòng CSV (dict hoặc pandas Series)"""
+        return cls([{"title": row["title"], **extract_attributes(row)} for row in rows])
+
+    def range(self, name: str, low=None, high=None, include_low: bool = True, include_high: bool = True) -> np.ndarray:
+        """Row ids with low <= value <= high (bounds optional), ascending by value"""
+        values = self.sorted_values[name]
+        start = 0 if low is None else np.searchsorted(values, low, side="left" if include_low else "right")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right" if include_high else "left")
+        return self.sorted_ids[name][start:end]
+
+    def _ids_mask(self, ids) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[ids] = True
+        return mask
+
+    def _condition_mask(self, name: str, condition) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(self.size, dtype=bool)
+        for operator, value in condition.items():
+            if operator not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {operator}")
+            if name in self.columns:
+                if operator == "$in":
+                    mask &= np.isin(self.columns[name], np.asarray(value, dtype=np.float64))
+                elif operator == "$ne":
+                    mask &= self.columns[name] != value
+                else:
+                    low = value if operator in ("$eq", "$gt", "$gte") else None
+                    high = value if operator in ("$eq", "$lt", "$lte") else None
+                    ids = self.range(name, low, high, include_low=operator != "$gt", include_high=operator != "$lt")
+                    mask &= self._ids_mask(ids)
+            elif name in self.categories:
+                groups = self.categories[name]
+                if operator in ("$eq", "$in"):
+                    values = value if operator == "$in" else [value]
+                    ids = [groups[v] for v in values if v in groups]
+                    mask &= self._ids_mask(np.concatenate(ids) if ids else np.empty(0, dtype=np.int64))
+                elif operator == "$ne":
+                    mask &= ~self._ids_mask(groups.get(value, np.empty(0, dtype=np.int64)))
+                else:
+                    raise ValueError(f"Operator {operator} is not supported for categorical attribute '{name}'")
+            else:
+                raise ValueError(f"Unknown attribute: {name}")
+        return mask
+
+    def mask(self, filters: dict = None) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for name, condition in (filters or {}).items():
+            mask &= self._condition_mask(name, condition)
+        return mask
+
+    def query(self, filters: dict = None, sort: str = None, descending: bool = False, limit: int = None) -> list:
+        """
+        Lọc, sắp xếp và lấy top-N.
+
+        :param sort: Thuộc tính số để sắp xếp; sản phẩm không có giá trị này bị bỏ qua
+        :return: List dict title + thuộc tính
+        """
+        mask = self.mask(filters)
+        if sort is None:
+            ids = np.flatnonzero(mask)
+        else:
+            order = self.sorted_ids[sort][::-1] if descending else self.sorted_ids[sort]
+            ids = order[mask[order]]
+        if limit is not None:
+            ids = ids[:limit]
+        return [self.documents[i] for i in ids]
+
+    def top(self, name: str, n: int = 1, descending: bool = True, filters: dict = None) -> list:
+        """vd: top("price") -> sản phẩm đắt nhất, top("price", descending=False) -> rẻ nhất"""
+        return self.query(filters, sort=name, descending=descending, limit=n)
+
+    def titles_matching(self, filters: dict = None) -> set:
+        """Tập title thoả điều kiện, dùng để lọc trước khi tìm kiếm vector"""
+        return {self.titles[i] for i in np.flatnonzero(self.mask(filters))}
+
+
+if __name__ == "__main__":
+    import csv
+
+    with open("hoanghamobile.csv", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    start = time.perf_counter()
+    index = AttributeIndex.from_rows(rows)
+    print(f"🗂️ Index {index.size} sản phẩm trong {(time.perf_counter() - start) * 1000:.1f} ms")
+    for name in NUMERIC_ATTRIBUTES:
+        print(f"   {name}: {len(index.sorted_ids[name])}/{index.size} có giá trị")
+
+    repeat = 1000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        most_expensive = index.top("price", 1)
+    print(f"💰 Đắt nhất: {most_expensive[0]['title']} ({most_expensive[0]['price']:,} ₫), {(time.perf_counter() - start) / repeat * 1e6:.1f} µs/truy vấn")
+
+    filters = {"price": {"$lte": 5_000_000}, "ram_gb": {"$gte": 8}}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = index.query(filters, sort="price", limit=5)
+    print(f"🔎 Dưới 5 triệu, RAM >= 8GB: {len(results)} kết quả, {(time.perf_counter() - start) / repeat * 1e6:.1f} µs/truy vấn")
+    for result in results:
+        print(f"   {result['title']} | {result['price']:,} ₫ | {result['ram_gb']:g}GB RAM")
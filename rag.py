@@ -1,43 +1,20 @@
 from embeddings import Embeddings
 from vector_db import VectorDatabase
+from catalog_sync import build_combine_row, sync_catalog, print_summary
+from product_attributes import AttributeIndex
 import pandas as pd
 
-def build_combine_row(row):
-    combine = f"Tên sản phẩm: {row['title']}\n"
-    combine += f"Mô tả: {row['product_specs']}\n"
-    combine += f"Giá: {row['current_price']}\n"
-    combine += f"Ưu đãi: {row['product_promotion']}\n"
-    combine += f"Màu sắc: {row['color_options']}\n"
-    return combine
-
 def main():
     df = pd.read_csv("hoanghamobile.csv")
     df['information'] = df.apply(build_combine_row, axis=1)
 
     vector_db = VectorDatabase(db_type="mongodb")
     # vector_db.client.delete_collection("products") Uncomment if db_type = "qdrant" and you want to reset the collection
-    embedding = Embeddings(model_name="text-embedding-3-small", type="openai")
+    # (cũng cần làm một lần với collection Qdrant / Chroma / MongoDB tạo trước khi dùng document_id làm ID)
+    embedding = Embeddings(model_name="text-embedding-3-small", type="openai", cache="embedding_cache.sqlite")
 
-    inserted_count = 0
-    for index, row in df.iterrows():
-        title = row['title']
-        if not vector_db.document_exists("products", {"title": title}):
-            doc = row['information']
-            embedding_vector = embedding.encode(doc)
-            vector_db.insert_document(
-                collection_name="products",
-                document={
-                    "title": title,
-                    "embedding": embedding_vector,
-                    "information": doc
-                }
-            )
-            inserted_count += 1
-            print(f"Inserted document {index + 1}/{len(df)}: {title}")
-    if inserted_count == 0:
-        print("All documents already exist in the vector database, skipping insertion.")
-    else:
-        print(f"Inserted {inserted_count} new documents.")
+    # Cùng cách ghép / embed với app.py, server.py, ingest.py (catalog_sync.build_document)
+    print_summary(sync_catalog(df, embedding, vector_db, "products"))
 
     # Query + RAG
     query = "Có điện thoại đắt nhất bên bạn là gì, có ưu đãi gì không ?"
@@ -47,6 +24,16 @@ def main():
         query_vector=query_embedding,
         limit=5
     )
+
+    # "Đắt nhất" là câu hỏi so sánh giá: lấy từ chỉ mục thuộc tính thay vì độ tương đồng embedding
+    attribute_index = AttributeIndex.from_rows(row for _, row in df.iterrows())
+    information_by_title = dict(zip(df['title'], df['information']))
+    most_expensive = [
+        {"title": product["title"], "information": information_by_title[product["title"]]}
+        for product in attribute_index.top("price", 3)
+    ]
+    seen = {product["title"] for product in most_expensive}
+    results = most_expensive + [result for result in results if result["title"] not in seen]
     # print("Thông tin được tìm kiếm thây:")
     # for result in results:
     #     print(f"Title: {result['title']}, Information: {result['information']}")
@@ -84,8 +71,56 @@ if __name__ == "__main__":
 #     id SERIAL PRIMARY KEY,
 #     title TEXT NOT NULL UNIQUE,
 #     information TEXT,
-#     embedding VECTOR(1536)
+#     embedding VECTOR(1536),
+#     content_hash TEXT,  -- catalog_sync.py: hash của phần được embed
+#     metadata_hash TEXT,  -- catalog_sync.py: hash của information (giá, ưu đãi, ...)
+#     -- product_attributes.py: thuộc tính có kiểu để lọc / sắp xếp
+#     price BIGINT,
+#     ram_gb REAL,
+#     storage_gb REAL,
+#     battery_mah INTEGER,
+#     screen_inch REAL,
+#     brand TEXT,
+#     has_promotion BOOLEAN
 # );
 
 # -- Create an index on the title for faster queries
 # CREATE INDEX IF NOT EXISTS idx_products_title ON products(title);
+
+# -- Nearest-neighbour search chạy trong Postgres: VectorDatabase.query gọi RPC match_<collection>
+# -- HNSW index cho cosine distance (<=>); với IVFFlat thay bằng:
+# -- CREATE INDEX ... USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
+# CREATE INDEX IF NOT EXISTS idx_products_embedding ON products
+#     USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+# -- Hàm SQL đơn giản (LANGUAGE sql STABLE, một câu SELECT) nên Postgres inline được:
+# -- filter (?brand=eq.samsung) và limit mà PostgREST thêm vào vẫn dùng được index HNSW.
+# -- Không LIMIT trong hàm để filter không làm mất kết quả.
+# CREATE OR REPLACE FUNCTION match_products(query_embedding VECTOR(1536))
+# RETURNS TABLE (
+#     title TEXT,
+#     information TEXT,
+#     score DOUBLE PRECISION,
+#     price BIGINT,
+#     ram_gb REAL,
+#     storage_gb REAL,
+#     battery_mah INTEGER,
+#     screen_inch REAL,
+#     brand TEXT,
+#     has_promotion BOOLEAN
+# )
+# LANGUAGE sql STABLE
+# AS $$
+#     SELECT p.title, p.information, 1 - (p.embedding <=> query_embedding) AS score,
+#            p.price, p.ram_gb, p.storage_gb, p.battery_mah, p.screen_inch, p.brand, p.has_promotion
+#     FROM products p
+#     ORDER BY p.embedding <=> query_embedding
+# $$;
+
+# -- Kiểm tra kế hoạch truy vấn (phải thấy "Index Scan using idx_products_embedding"):
+# EXPLAIN ANALYZE SELECT * FROM match_products((SELECT embedding FROM products LIMIT 1)) LIMIT 5;
+# -- Lọc chặt làm HNSW trả về ít hơn limit: tăng SET hnsw.ef_search = 100; (pgvector >= 0.8: SET hnsw.iterative_scan = relaxed_order;)
+
+# -- Chạy thử với Postgres local: `supabase start` (Supabase CLI: Postgres + pgvector + PostgREST),
+# -- chạy các lệnh SQL trên trong Studio, rồi đặt SUPABASE_URL=http://127.0.0.1:54321 và SUPABASE_KEY=<service_role key>
+# -- trước khi chạy VectorDatabase(db_type="supabase").
@@ -0,0 +1,117 @@
+from embeddings import Embeddings
+from vector_db import VectorDatabase
+from catalog_sync import build_combine_row, sync_catalog, print_summary
+import pandas as pd
+from semantic_router.route import Route
+from semantic_router.router import SemanticRouter
+from semantic_router.samples import productsSample
+from semantic_router.samples import chitchatSample
+from reflection import Reflection
+from context_manager import ProductContext
+import openai
+import os
+from hybrid_retriever import HybridRetriever
+
+
+def main():
+    df = pd.read_csv("hoanghamobile.csv")
+    df['information'] = df.apply(build_combine_row, axis=1)
+
+    vector_db = VectorDatabase(db_type="mongodb")
+    embedding = Embeddings(model_name="text-embedding-3-small", type="openai", cache="embedding_cache.sqlite")
+    routes = [
+        Route(name="products", samples=productsSample),
+        Route(name="chitchat", samples=chitchatSample)
+    ]
+    router = SemanticRouter(embedding, routes, aggregation="topk", top_k=5, margin=0.4)
+    # Cùng cách ghép / embed với app.py, server.py, ingest.py (catalog_sync.build_document)
+    print_summary(sync_catalog(df, embedding, vector_db, "products"))
+    # KEYWORD_BACKEND=bm25: dùng index BM25 nhúng (bm25_index.py) thay cho Elasticsearch node
+    if os.getenv("KEYWORD_BACKEND", "elasticsearch") == "bm25":
+        from bm25_index import BM25Index
+        es_db = BM25Index()
+    else:
+        from elasticsearch_db import ElasticSearchDB
+        es_db = ElasticSearchDB()
+    if es_db.count_documents() == 0:
+        print("🔄 Chưa có dữ liệu trong Elasticsearch, đang chèn...")
+        for index, row in df.iterrows():
+            doc = {
+                "title": row["title"],
+                "information": row["information"]
+            }
+            es_db.insert_document(doc)
+            print(f"Inserted document {index + 1}/{len(df)}: {row['title']}")
+        print("✅ Đã chèn xong dữ liệu.")
+    else:
+        print("✅ Dữ liệu đã tồn tại trong Elasticsearch, bỏ qua insert.")
+    retriever = HybridRetriever(embedding, vector_db, es_db, fusion="rrf")
+
+    # Khởi tạo một lần để giữ cache rewrite giữa các lượt hỏi
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    reflection = Reflection(openai)
+    print("Hệ thống đã sẵn sàng. Bạn có thể hỏi về sản phẩm. Gõ 'quit' để thoát.")
+    
+    # Lưu toàn bộ lịch sử hội thoại
+    messages = [
+        {
+            "role": "system",
+            "content": """Bạn là một nhân viên tư vấn bán hàng chuyên nghiệp tại cửa hàng Quang Đạt Phone. Xưng em và xưng khách hàng là anh/chị. Đôi khi sử dụng icon emoji trong câu trả lời. Nhiệm vụ của bạn là trả lời các câu hỏi của khách hàng một cách rõ ràng, thân thiện và dựa hoàn toàn vào các thông tin sản phẩm được cung cấp bên dưới.
+Chỉ sử dụng thông tin có trong dữ liệu. Không tự tạo ra thông tin nếu không được cung cấp.
+Nếu không tìm thấy câu trả lời, hãy lịch sự trả lời rằng hiện tại bạn chưa có đủ thông tin để tư vấn chính xác.
+Hãy ưu tiên ngắn gọn, dễ hiểu. Nếu khách hỏi gợi ý sản phẩm, hãy liệt kê một vài mẫu phù hợp và lý do tại sao nên chọn.
+Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình."""
+        }
+    ]
+    # Dữ liệu sản phẩm trong system prompt: không trùng lặp, giới hạn theo ngân sách token
+    product_context = ProductContext(messages[0]["content"])
+
+    while True:
+        query = input("💬 Câu hỏi của bạn: ")
+        if query.strip().lower() in ["quit", "exit"]:
+            print("Tạm biệt anh/chị! Hẹn gặp lại 😊")
+            print(f"🔁 Reflection: {reflection.stats()}")
+            es_db.close()
+            break
+
+        # Phân loại bằng Semantic Router
+        rewritten_query = reflection.rewrite(messages, query)
+        route_result = router.guide(rewritten_query)
+        best_route = route_result[1]
+        print(route_result)
+        print(f"[Semantic Router] → Phân loại: {best_route}")
+
+        if best_route == "uncertain":
+            # Có thể hỏi lại user hoặc fallback sang chitchat
+            print("🤔 Em không chắc chắn câu hỏi này. Anh/chị có thể nói rõ hơn được không?")
+            continue
+
+        elif best_route == "products":
+            # RAG: BM25 (Elasticsearch) + vector search, gộp bằng RRF
+            results = retriever.search(rewritten_query, limit=5)
+            for i, result in enumerate(results):
+                print(f"🔍 Kết quả {i + 1}: {result['title']} | {'+'.join(result['sources'])} | Score: {result['score']:.4f}")
+                print(f"   Thông tin: {result['information'][:100]}...")
+            for source, stats in retriever.stats().items():
+                print(f"📊 {source}: {stats['avg_latency'] * 1000:.0f} ms/query, đóng góp {stats['contributed']} kết quả")
+            # Dựng lại system prompt từ prompt gốc + các sản phẩm đang giữ
+            product_context.update(results)
+            messages[0]["content"] = product_context.system_prompt()
+            messages.append({"role": "user", "content": rewritten_query})
+        else:
+            messages.append({"role": "user", "content": query})
+
+        response = embedding.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages
+        )
+        reply = response.choices[0].message.content.strip()
+        print("🤖 Trả lời:", reply)
+        print("-" * 80)
+
+        messages.append({"role": "assistant", "content": reply})
+
+
+    
+if __name__ == "__main__":
+    main()
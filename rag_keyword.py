@@ -1,37 +1,36 @@
 from embeddings import Embeddings
 from vector_db import VectorDatabase
+from catalog_sync import build_combine_row
 import pandas as pd
 from semantic_router.route import Route
 from semantic_router.router import SemanticRouter
 from semantic_router.samples import productsSample
 from semantic_router.samples import chitchatSample
 from reflection import Reflection
+from context_manager import ProductContext
 import openai
 import os
 from rerank import Reranker
-from elasticsearch_db import ElasticSearchDB
 
 
-def build_combine_row(row):
-    combine = f"Tên sản phẩm: {row['title']}\n"
-    combine += f"Mô tả: {row['product_specs']}\n"
-    combine += f"Giá: {row['current_price']}\n"
-    combine += f"Ưu đãi: {row['product_promotion']}\n"
-    combine += f"Màu sắc: {row['color_options']}\n"
-    return combine
-
 def main():
     df = pd.read_csv("hoanghamobile.csv")
     df['information'] = df.apply(build_combine_row, axis=1)
 
     vector_db = VectorDatabase(db_type="mongodb")
-    embedding = Embeddings(model_name="text-embedding-3-small", type="openai")
+    embedding = Embeddings(model_name="text-embedding-3-small", type="openai", cache="embedding_cache.sqlite")
     routes = [
         Route(name="products", samples=productsSample),
         Route(name="chitchat", samples=chitchatSample)
     ]
-    router = SemanticRouter(embedding, routes)
-    es_db = ElasticSearchDB()
+    router = SemanticRouter(embedding, routes, aggregation="topk", top_k=5, margin=0.4)
+    # KEYWORD_BACKEND=bm25: dùng index BM25 nhúng (bm25_index.py) thay cho Elasticsearch node
+    if os.getenv("KEYWORD_BACKEND", "elasticsearch") == "bm25":
+        from bm25_index import BM25Index
+        es_db = BM25Index()
+    else:
+        from elasticsearch_db import ElasticSearchDB
+        es_db = ElasticSearchDB()
     if es_db.count_documents() == 0:
         print("🔄 Chưa có dữ liệu trong Elasticsearch, đang chèn...")
         for index, row in df.iterrows():
@@ -45,6 +44,9 @@ def main():
     else:
         print("✅ Dữ liệu đã tồn tại trong Elasticsearch, bỏ qua insert.")
 
+    # Khởi tạo một lần để giữ cache rewrite giữa các lượt hỏi
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    reflection = Reflection(openai)
     print("Hệ thống đã sẵn sàng. Bạn có thể hỏi về sản phẩm. Gõ 'quit' để thoát.")
     
     # Lưu toàn bộ lịch sử hội thoại
@@ -58,16 +60,18 @@ Hãy ưu tiên ngắn gọn, dễ hiểu. Nếu khách hỏi gợi ý sản ph
 Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình."""
         }
     ]
+    # Dữ liệu sản phẩm trong system prompt: không trùng lặp, giới hạn theo ngân sách token
+    product_context = ProductContext(messages[0]["content"])
 
     while True:
         query = input("💬 Câu hỏi của bạn: ")
         if query.strip().lower() in ["quit", "exit"]:
             print("Tạm biệt anh/chị! Hẹn gặp lại 😊")
+            print(f"🔁 Reflection: {reflection.stats()}")
+            es_db.close()
             break
 
         # Phân loại bằng Semantic Router
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        reflection = Reflection(openai)
         rewritten_query = reflection.rewrite(messages, query)
         route_result = router.guide(rewritten_query)
         best_route = route_result[1]
@@ -85,11 +89,9 @@ Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình
             for i, result in enumerate(results):
                 print(f"🔍 Kết quả {i + 1}: {result['title']}")
                 print(f"   Thông tin: {result['information'][:100]}...")
-            context = "\n".join([doc["information"] for doc in results])
-
-
-            new_system_content = messages[0]["content"] + f"\nDữ liệu sản phẩm liên quan:\n{context}"
-            messages[0]["content"] = new_system_content
+            # Dựng lại system prompt từ prompt gốc + các sản phẩm đang giữ
+            product_context.update(results)
+            messages[0]["content"] = product_context.system_prompt()
             messages.append({"role": "user", "content": query})
         else:
             messages.append({"role": "user", "content": query})
@@ -1,11 +1,46 @@
 from typing import List, Dict
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+
+# Đại từ / từ chỉ định thường trỏ về ngữ cảnh trước đó
+COREFERENCE_MARKERS = {
+    "nó", "này", "đó", "kia", "ấy", "vậy", "thế", "trên", "vừa", "họ", "chúng",
+    "it", "this", "that", "these", "those", "they", "them", "one",
+}
+FOLLOW_UP_PREFIXES = ("còn ", "vậy ", "thế ", "thì ", "so với ", "what about ", "and ")
 
 class Reflection:
-    def __init__(self, llm_client):
+    def __init__(self, llm_client, cache_size: int = 1024, min_standalone_words: int = 4):
         """
         llm_client: OpenAI client đã khởi tạo (vd: openai)
+        cache_size: Số câu viết lại được nhớ theo (lịch sử, câu hỏi)
+        min_standalone_words: Câu hỏi ngắn hơn số từ này luôn được viết lại khi có lịch sử
         """
         self.llm_client = llm_client
+        self.cache_size = cache_size
+        self.min_standalone_words = min_standalone_words
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.skipped = 0
+        self.cache_hits = 0
+        self.llm_calls = 0
+        self.llm_latency = 0.0
+
+    def needs_rewrite(self, chat_history: List[Dict], current_query: str) -> bool:
+        """Heuristic rẻ: chỉ gọi LLM khi có lịch sử và câu hỏi có vẻ phụ thuộc ngữ cảnh"""
+        if not chat_history:
+            return False
+        query = " ".join(current_query.lower().split())
+        words = re.findall(r"\w+", query)
+        if len(words) < self.min_standalone_words:
+            return True
+        if query.startswith(FOLLOW_UP_PREFIXES):
+            return True
+        return any(word in COREFERENCE_MARKERS for word in words)
 
     def rewrite(self, messages: List[Dict], current_query: str) -> str:
         """
@@ -15,13 +50,30 @@ class Reflection:
         :param current_query: Câu hỏi hiện tại từ người dùng
         :return: Câu hỏi đã viết lại
         """
+        self.calls += 1
         # Lấy 10 messages gần nhất không phải role = system
-        chat_history = [msg for msg in messages if msg['role'] in ('user', 'assistant')][-10:]
+        chat_history = [msg for msg in messages if msg['role'] in ('user', 'assistant')]
+        # Câu hỏi hiện tại có thể đã được thêm vào cuối lịch sử
+        if chat_history and chat_history[-1]['role'] == 'user' and chat_history[-1]['content'] == current_query:
+            chat_history = chat_history[:-1]
+        chat_history = chat_history[-10:]
+
+        if not self.needs_rewrite(chat_history, current_query):
+            self.skipped += 1
+            return current_query
 
         history_text = ""
         for msg in chat_history:
             role = "Khách" if msg["role"] == "user" else "Bot"
             history_text += f"{role}: {msg['content']}\n"
+
+        key = (hashlib.sha1(history_text.encode("utf-8")).hexdigest(), current_query)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+
         history_text += f"Khách: {current_query}\n"
 
         prompt = [
@@ -36,11 +88,28 @@ class Reflection:
         ]
 
         # Gọi LLM để rewrite câu hỏi
+        start = time.perf_counter()
         response = self.llm_client.chat.completions.create(
             model="gpt-4o-mini",
             messages=prompt
         )
+        self.llm_latency += time.perf_counter() - start
+        self.llm_calls += 1
 
         rewritten = response.choices[0].message.content.strip()
         print(f"🔁 Reflection: \"{rewritten}\"")
+        with self._lock:
+            self._cache[key] = rewritten
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
         return rewritten
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "skipped": self.skipped,
+            "cache_hits": self.cache_hits,
+            "llm_calls": self.llm_calls,
+            "skip_rate": (self.skipped + self.cache_hits) / self.calls if self.calls else 0.0,
+            "avg_llm_latency": self.llm_latency / self.llm_calls if self.llm_calls else 0.0,
+        }
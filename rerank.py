@@ -1,7 +1,7 @@
 
-from sentence_transformers import CrossEncoder
 import numpy as np
 
+# from sentence_transformers import CrossEncoder
 # class Reranker():
 #     def __init__(self, model_name: str = "BAAI/bge-reranker-v2-m3"):
 #         self.reranker = CrossEncoder(model_name, trust_remote_code=True)
@@ -25,19 +25,153 @@ import numpy as np
 
 # Model anh Nam
 
-from FlagEmbedding import FlagReranker
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+
+class CPUCrossEncoder:
+    """
+    Cross-encoder inference tuned for GPU-less hosts.
+
+    backend="int8": PyTorch dynamic int8 quantization of the Linear layers.
+    backend="onnx": ONNX graph exported with optimum, run by ONNX Runtime.
+    The export runs once and is saved under onnx_cache_dir; later process
+    starts load the saved graph.
+    Exposes the same compute_score() as FlagReranker.
+    """
+
+    def __init__(self, model_name: str, backend: str = "int8", num_threads: int = None, max_length: int = 512,
+                 onnx_cache_dir: str = "onnx_models"):
+        import torch
+        from transformers import AutoTokenizer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if backend == "int8":
+            from transformers import AutoModelForSequenceClassification
+
+            model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+            self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == "onnx":
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            export_dir = os.path.join(onnx_cache_dir, model_name.replace("/", "__"))
+            exported = os.path.exists(os.path.join(export_dir, "model.onnx"))
+            self.model = ORTModelForSequenceClassification.from_pretrained(
+                export_dir if exported else model_name,
+                export=not exported,
+                provider="CPUExecutionProvider",
+                session_options=options
+            )
+            if not exported:
+                # Export ONNX chậm (vài chục giây): chỉ làm lần đầu, các lần sau load từ thư mục cache
+                self.model.save_pretrained(export_dir)
+        else:
+            raise ValueError(f"Unsupported CPU backend: {backend}")
+
+    def compute_score(self, sentence_pairs: list, batch_size: int = 16, max_length: int = None, normalize: bool = False) -> list:
+        import torch
+
+        scores = []
+        for start in range(0, len(sentence_pairs), batch_size):
+            batch = sentence_pairs[start:start + batch_size]
+            inputs = self.tokenizer(
+                [query for query, _ in batch],
+                [passage for _, passage in batch],
+                padding=True,
+                truncation="only_second",
+                max_length=max_length or self.max_length,
+                return_tensors="pt"
+            )
+            with torch.inference_mode():
+                logits = self.model(**inputs).logits.view(-1).float()
+            if normalize:
+                logits = torch.sigmoid(logits)
+            scores.extend(logits.tolist())
+        return scores
 
 class Reranker:
-    def __init__(self, model_name: str = "namdp-ptit/ViRanker", use_fp16: bool = True, normalize: bool = True):
-        self.reranker = FlagReranker(model_name, use_fp16=use_fp16)
+    def __init__(self, model_name: str = "namdp-ptit/ViRanker", use_fp16: bool = True, normalize: bool = True, cache_size: int = 4096, batch_size: int = 16,
+                 backend: str = "flag", num_threads: int = None, max_length: int = 512, model=None):
+        """
+        :param cache_size: Số điểm (query, passage) tối đa giữ trong LRU cache
+        :param batch_size: Số cặp mỗi lần gọi model; các cặp được xếp theo độ dài để giảm padding
+        :param backend: "flag" (FlagReranker), hoặc "int8" / "onnx" cho máy chỉ có CPU
+        :param num_threads: Số thread CPU cho backend int8 / onnx
+        :param max_length: Cắt cặp (query, passage) về tối đa số token này
+        :param model: Đối tượng có compute_score() dùng thay cho model tải từ model_name (vd: model giả trong benchmarks/)
+        """
+        if model is not None:
+            self.reranker = model
+        elif backend == "flag":
+            from FlagEmbedding import FlagReranker
+            self.reranker = FlagReranker(model_name, use_fp16=use_fp16)
+        else:
+            self.reranker = CPUCrossEncoder(model_name, backend=backend, num_threads=num_threads, max_length=max_length)
+        self.backend = backend
+        self.max_length = max_length
         self.normalize = normalize
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batch_latencies = []  # (số cặp, giây) của các batch gần nhất
 
-    def __call__(self, query: str, passages: list[str]) -> tuple[list[float], list[str]]:
-        # Tạo cặp [query, passage] cho mỗi passage
-        query_passage_pairs = [[query, passage] for passage in passages]
+    @staticmethod
+    def _cache_key(query: str, passage: str):
+        return " ".join(query.lower().split()), hashlib.sha1(passage.encode("utf-8")).hexdigest()
+
+    def _score_batch(self, pairs: list) -> list:
+        scores = self.reranker.compute_score(pairs, normalize=self.normalize, batch_size=len(pairs), max_length=self.max_length)
+        if not isinstance(scores, (list, tuple, np.ndarray)):
+            scores = [scores]
+        return [float(score) for score in scores]
 
-        # Tính điểm từ reranker model
-        scores = self.reranker.compute_score(query_passage_pairs, normalize=self.normalize)
+    def _score(self, query: str, passages: list) -> list:
+        keys = [self._cache_key(query, passage) for passage in passages]
+        scores = {}
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, i)
+                    self.misses += 1
+
+        # Chỉ chấm các cặp chưa có trong cache, gom batch theo độ dài passage
+        order = sorted(missing.items(), key=lambda item: len(passages[item[1]]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            started = time.perf_counter()
+            batch_scores = self._score_batch([[query, passages[i]] for _, i in batch])
+            with self._lock:
+                self.batch_latencies.append((len(batch), time.perf_counter() - started))
+                for (key, _), score in zip(batch, batch_scores):
+                    scores[key] = score
+                    self._cache[key] = score
+        with self._lock:
+            self.batch_latencies = self.batch_latencies[-100:]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def __call__(self, query: str, passages: list[str]) -> tuple[list[float], list[str]]:
+        if not passages:
+            return [], []
+        scores = self._score(query, passages)
 
         # Sắp xếp passage theo điểm số giảm dần
         ranked_data = sorted(zip(scores, passages), key=lambda x: x[0], reverse=True)
@@ -45,3 +179,48 @@ class Reranker:
 
         # Đảm bảo đầu ra là list chuẩn
         return list(ranked_scores), list(ranked_passages)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        pairs = sum(size for size, _ in self.batch_latencies)
+        seconds = sum(latency for _, latency in self.batch_latencies)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "cache_size": len(self._cache),
+            "batches": len(self.batch_latencies),
+            "avg_batch_latency": seconds / len(self.batch_latencies) if self.batch_latencies else 0.0,
+            "pairs_per_second": pairs / seconds if seconds else 0.0,
+        }
+
+def benchmark(reranker, pairs: list, repeat: int = 3) -> float:
+    """Pairs/second of the raw model (bypasses the score cache)"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        reranker._score_batch(pairs)
+    return repeat * len(pairs) / (time.perf_counter() - started)
+
+if __name__ == "__main__":
+    # So sánh điểm của backend CPU với FlagReranker fp32 và đo tốc độ (pairs/s)
+    import pandas as pd
+
+    df = pd.read_csv("hoanghamobile.csv").head(7)
+    passages = [f"{row['title']}\n{row['product_specs']}\nGiá: {row['current_price']}" for _, row in df.iterrows()]
+    queries = ["Điện thoại nào pin trâu nhất?", "Giá iPhone 15 bao nhiêu?", "samsung galaxy a05s 6gb"]
+    pairs = [[query, passage] for query in queries for passage in passages]
+
+    reference = Reranker(use_fp16=False)
+    reference_scores = np.array(reference._score_batch(pairs))
+    print(f"flag fp32: {benchmark(reference, pairs):.1f} pairs/s")
+
+    for backend in ("int8", "onnx"):
+        candidate = Reranker(backend=backend, num_threads=4)
+        scores = np.array(candidate._score_batch(pairs))
+        max_diff = float(np.max(np.abs(scores - reference_scores)))
+        same_order = all(
+            np.array_equal(np.argsort(-reference_scores[i:i + len(passages)]), np.argsort(-scores[i:i + len(passages)]))
+            for i in range(0, len(pairs), len(passages))
+        )
+        print(f"{backend}: {benchmark(candidate, pairs):.1f} pairs/s, max |Δscore| = {max_diff:.4f}, same ranking: {same_order}")
+        assert max_diff < 0.05, f"{backend} lệch quá nhiều so với fp32"
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by the (rewritten) query embedding.
+
+    A lookup hits when a cached query is at least `threshold` cosine-similar,
+    is younger than `ttl` seconds, and was answered from the same retrieved
+    product set. If the products changed (e.g. a price update changes their
+    text) the stale entry is dropped.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._embeddings = None
+        self._entries = []
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def fingerprint(results: list) -> str:
+        """Hash of the retrieved products (title + information), order-insensitive"""
+        digest = hashlib.sha256()
+        for title, information in sorted((str(r.get("title", "")), str(r.get("information", ""))) for r in results):
+            digest.update(title.encode("utf-8") + b"\x00" + information.encode("utf-8") + b"\x01")
+        return digest.hexdigest()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def _remove(self, keep):
+        self._entries = [entry for entry, kept in zip(self._entries, keep) if kept]
+        self._embeddings = self._embeddings[np.asarray(keep, dtype=bool)] if self._entries else None
+
+    def _expire(self):
+        if self._entries:
+            now = time.time()
+            keep = [now - entry["created"] <= self.ttl for entry in self._entries]
+            if not all(keep):
+                self._remove(keep)
+
+    def lookup(self, query_embedding, fingerprint: str):
+        """Return the cached answer or None"""
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._expire()
+            if self._entries:
+                similarities = self._embeddings @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    if self._entries[best]["fingerprint"] == fingerprint:
+                        self.hits += 1
+                        return self._entries[best]["answer"]
+                    # Cùng câu hỏi nhưng dữ liệu sản phẩm đã đổi: bỏ câu trả lời cũ
+                    self.stale += 1
+                    self._remove([i != best for i in range(len(self._entries))])
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, fingerprint: str, answer: str, query: str = None):
+        query_embedding = self._normalize(query_embedding)
+        with self._lock:
+            self._entries.append({"query": query, "fingerprint": fingerprint, "answer": answer, "created": time.time()})
+            if self._embeddings is None:
+                self._embeddings = query_embedding[None, :]
+            else:
+                self._embeddings = np.vstack([self._embeddings, query_embedding])
+            if len(self._entries) > self.max_entries:
+                self._remove([i >= len(self._entries) - self.max_entries for i in range(len(self._entries))])
+
+    def invalidate(self):
+        """Drop everything, e.g. after a catalog refresh"""
+        with self._lock:
+            self._entries = []
+            self._embeddings = None
+
+    @staticmethod
+    def stream(answer: str):
+        """Yield a cached answer word by word, like a streamed completion"""
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + " "
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
@@ -1,30 +1,76 @@
 import numpy as np
 
 class SemanticRouter():
-    def __init__(self, embedding, routes):
+    def __init__(self, embedding, routes, aggregation="mean", top_k=5, threshold=None, margin=None):
+        """
+        :param aggregation: Cách gộp điểm theo route: "mean", "max" hoặc "topk" (bỏ phiếu top_k sample gần nhất)
+        :param threshold: Điểm route tốt nhất thấp hơn ngưỡng này -> "uncertain"
+        :param margin: Chênh lệch giữa route tốt nhất và thứ nhì nhỏ hơn giá trị này -> "uncertain"
+        """
+        if aggregation not in ("mean", "max", "topk"):
+            raise ValueError(f"Unsupported aggregation: {aggregation}")
         self.routes = routes
         self.embedding = embedding
-        self.routesEmbedding = {}
+        self.aggregation = aggregation
+        self.top_k = top_k
+        self.threshold = threshold
+        self.margin = margin
+        self.routeNames = [route.name for route in routes]
 
-        for route in self.routes:
-            self.routesEmbedding[
-                route.name
-            ] = self.embedding.encode(route.samples)
+        samples, labels = [], []
+        for i, route in enumerate(self.routes):
+            if not route.samples:
+                raise ValueError(f"Route '{route.name}' has no samples")
+            samples.extend(route.samples)
+            labels.extend([i] * len(route.samples))
+
+        # Một ma trận sample duy nhất, chuẩn hoá theo từng dòng, kèm nhãn route
+        samplesEmbedding = self.embedding.encode_batch(samples)
+        self.samplesEmbedding = samplesEmbedding / np.linalg.norm(samplesEmbedding, axis=1, keepdims=True)
+        self.sampleLabels = np.asarray(labels)
+        self.routeOffsets = np.searchsorted(self.sampleLabels, np.arange(len(self.routes)))
+        counts = np.bincount(self.sampleLabels, minlength=len(self.routes))
+        self.routeMeans = np.eye(len(self.routes))[self.sampleLabels] / counts
+
+        self.routesEmbedding = {
+            route.name: self.samplesEmbedding[self.sampleLabels == i]
+            for i, route in enumerate(self.routes)
+        }
 
     def get_routes(self):
         return self.routes
 
-    def guide(self, query):
-        queryEmbedding = self.embedding.encode([query]) 
-        queryEmbedding = queryEmbedding / np.linalg.norm(queryEmbedding)
-        scores = []
+    def route_scores(self, queries):
+        """Score matrix of shape (len(queries), len(routes))"""
+        queryEmbedding = np.asarray(self.embedding.encode_batch(queries), dtype=np.float32)
+        queryEmbedding = queryEmbedding / np.linalg.norm(queryEmbedding, axis=1, keepdims=True)
 
-        # Calculate the cosine similarity of the query embedding with the sample embeddings of the router.
+        # Cosine similarity của mọi query với mọi sample trong một phép nhân ma trận
+        similarities = queryEmbedding @ self.samplesEmbedding.T
 
-        for route in self.routes:
-            routesEmbedding = self.routesEmbedding[route.name] / np.linalg.norm(self.routesEmbedding[route.name])
-            score = np.mean(np.dot(routesEmbedding, queryEmbedding.T).flatten())
-            scores.append((score, route.name))
+        if self.aggregation == "mean":
+            return similarities @ self.routeMeans
+        elif self.aggregation == "max":
+            return np.maximum.reduceat(similarities, self.routeOffsets, axis=1)
+        else:
+            k = min(self.top_k, similarities.shape[1])
+            nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            votes = np.zeros((len(similarities), len(self.routes)))
+            np.add.at(votes, (np.arange(len(similarities))[:, None], self.sampleLabels[nearest]), 1)
+            return votes / k
 
-        scores.sort(reverse=True)
-        return scores[0]
\ No newline at end of file
+    def guide_many(self, queries):
+        scores = self.route_scores(queries)
+        results = []
+        for row in scores:
+            order = np.argsort(-row)
+            best = float(row[order[0]])
+            second = float(row[order[1]]) if len(order) > 1 else float("-inf")
+            if (self.threshold is not None and best < self.threshold) or (self.margin is not None and best - second < self.margin):
+                results.append((best, "uncertain"))
+            else:
+                results.append((best, self.routeNames[order[0]]))
+        return results
+
+    def guide(self, query):
+        return self.guide_many([query])[0]
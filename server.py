@@ -0,0 +1,283 @@
+"""
+HTTP chat API.
+
+    python server.py
+    gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:8000 server:app
+
+Each worker process builds one embedding / vector DB / router / reranker
+stack and shares it across its threads. Do not use --preload: database
+clients are created per worker, after the fork.
+
+Sessions live in a per-worker memory LRU that spills to a SQLite file, so
+with several workers put the API behind a load balancer with sticky
+sessions (or a single worker with many threads).
+
+Environment: VECTOR_DB (default "mongodb"), PRODUCTS_CSV, RERANKER_BACKEND
+("flag", "int8" or "onnx"; unset = no rerank), SESSION_DB, MAX_SESSIONS,
+SESSION_IDLE_TTL, SYNC_CATALOG=1 to delta-sync PRODUCTS_CSV on startup (only
+with a single worker; otherwise run catalog_sync.py before deploying).
+"""
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask_cors import CORS
+from embeddings import Embeddings
+from vector_db import VectorDatabase
+from semantic_router.route import Route
+from semantic_router.router import SemanticRouter
+from semantic_router.samples import productsSample, chitchatSample
+from reflection import Reflection
+from pipeline import SpeculativePipeline
+from semantic_cache import SemanticCache
+from context_manager import ProductContext
+from session_store import MemorySessionStore, SQLiteSessionStore
+from catalog_sync import sync_catalog, print_summary
+from metadata_filter import normalize_filter
+import pandas as pd
+import openai
+import threading
+import json
+import uuid
+import os
+
+SYSTEM_PROMPT = """Bạn là một nhân viên tư vấn bán hàng chuyên nghiệp tại cửa hàng Quang Đạt Phone. Xưng em và xưng khách hàng là anh/chị. Đôi khi sử dụng icon emoji trong câu trả lời. Nhiệm vụ của bạn là trả lời các câu hỏi của khách hàng một cách rõ ràng, thân thiện và dựa hoàn toàn vào các thông tin sản phẩm được cung cấp bên dưới.
+Chỉ sử dụng thông tin có trong dữ liệu. Không tự tạo ra thông tin nếu không được cung cấp.
+Nếu không tìm thấy câu trả lời, hãy lịch sự trả lời rằng hiện tại bạn chưa có đủ thông tin để tư vấn chính xác.
+Hãy ưu tiên ngắn gọn, dễ hiểu. Nếu khách hỏi gợi ý sản phẩm, hãy liệt kê một vài mẫu phù hợp và lý do tại sao nên chọn.
+Luôn giữ thái độ lịch sự, chuyên nghiệp và hỗ trợ hết mình."""
+
+UNCERTAIN_REPLY = "🤔 Em chưa chắc chắn về câu hỏi này. Anh/chị có thể nói rõ hơn được không?"
+MAX_HISTORY = 40  # Số message user/assistant giữ lại mỗi phiên
+MAX_RETRIEVE_LIMIT = 50  # limit của /retrieve được kẹp vào 1..50
+
+app = Flask(__name__)
+CORS(app)
+
+class ChatStack:
+    """Warm models and clients shared by every request thread of a worker"""
+
+    def __init__(self):
+        self.vector_db = VectorDatabase(db_type=os.getenv("VECTOR_DB", "mongodb"))
+        self.embedding = Embeddings(model_name="text-embedding-3-small", type="openai", cache="embedding_cache.sqlite")
+
+        routes = [
+            Route(name="products", samples=productsSample),
+            Route(name="chitchat", samples=chitchatSample)
+        ]
+        self.router = SemanticRouter(self.embedding, routes, aggregation="topk", top_k=5, margin=0.4)
+
+        if os.getenv("SYNC_CATALOG") == "1":
+            df = pd.read_csv(os.getenv("PRODUCTS_CSV", "hoanghamobile.csv"))
+            print_summary(sync_catalog(df, self.embedding, self.vector_db, "products"))
+
+        self.reranker = None
+        if os.getenv("RERANKER_BACKEND"):
+            from rerank import Reranker
+            self.reranker = Reranker(backend=os.getenv("RERANKER_BACKEND"))
+
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        # Rerank cần nhiều ứng viên hơn số sản phẩm đưa vào prompt.
+        # Pool dùng chung cho mọi request, mỗi lượt giữ tối đa một worker: đặt PIPELINE_WORKERS >= số thread của gunicorn
+        self.pipeline = SpeculativePipeline(Reflection(openai), self.router, self.embedding, self.vector_db,
+                                            limit=10 if self.reranker else 5,
+                                            max_workers=int(os.getenv("PIPELINE_WORKERS", "32")))
+        self.semantic_cache = SemanticCache(threshold=0.95, ttl=3600)
+
+    def rerank(self, query, results, limit=5):
+        if self.reranker is None or not results:
+            return results[:limit]
+        by_information = {result["information"]: result for result in results}
+        scores, ranked_passages = self.reranker(query, list(by_information))
+        return [
+            {"title": by_information[passage]["title"], "information": passage, "score": score}
+            for score, passage in zip(scores[:limit], ranked_passages[:limit])
+        ]
+
+_stack = None
+_stack_error = None
+_stack_lock = threading.Lock()
+
+def get_stack() -> ChatStack:
+    global _stack, _stack_error
+    if _stack is None:
+        with _stack_lock:
+            if _stack is None:
+                try:
+                    _stack = ChatStack()
+                    _stack_error = None
+                except Exception as e:
+                    _stack_error = repr(e)
+                    raise
+    return _stack
+
+# Phiên hội thoại: RAM (LRU + idle TTL) -> SQLite. System prompt không được lưu mà dựng lại từ ProductContext
+session_store = MemorySessionStore(
+    max_sessions=int(os.getenv("MAX_SESSIONS", 10_000)),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", 1800)),
+    spill=SQLiteSessionStore(os.getenv("SESSION_DB", "sessions.sqlite"))
+)
+# Lock theo nhóm session_id để các lượt của cùng một phiên không chen nhau
+_session_locks = [threading.Lock() for _ in range(256)]
+
+def session_lock(session_id):
+    return _session_locks[hash(session_id) % len(_session_locks)]
+
+def load_session(session_id):
+    session = session_store.get(session_id) or {"messages": [], "products": {}}
+    product_context = ProductContext(SYSTEM_PROMPT).load_state(session["products"])
+    messages = [{"role": "system", "content": product_context.system_prompt()}] + session["messages"]
+    return messages, product_context
+
+def save_session(session_id, messages, product_context):
+    session_store.put(session_id, {"messages": messages[1:][-MAX_HISTORY:], "products": product_context.state()})
+
+def sse(data, event=None) -> str:
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def chat_events(stack, messages, product_context, query):
+    messages.append({"role": "user", "content": query})
+
+    # Rewrite chạy song song với định tuyến + truy vấn trên câu hỏi gốc
+    turn = stack.pipeline.run(messages, query)
+    rewritten_query = turn["rewritten_query"]
+    best_route = turn["route"][1]
+    results = stack.rerank(rewritten_query, turn["results"]) if best_route == "products" else []
+    yield sse({"route": best_route, "rewritten_query": rewritten_query, "products": [r["title"] for r in results]}, "meta")
+
+    if best_route == "uncertain":
+        messages.pop()
+        yield sse({"token": UNCERTAIN_REPLY})
+        yield sse({"reply": UNCERTAIN_REPLY, "cached": False}, "done")
+        return
+
+    cached_reply = None
+    if best_route == "products":
+        products_fingerprint = SemanticCache.fingerprint(results)
+        cached_reply = stack.semantic_cache.lookup(turn["query_embedding"], products_fingerprint)
+        product_context.update(results)
+        messages[0]["content"] = product_context.system_prompt()
+        messages[-1] = {"role": "user", "content": rewritten_query}
+
+    if cached_reply is not None:
+        tokens = SemanticCache.stream(cached_reply)
+    else:
+        response_stream = stack.embedding.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            stream=True
+        )
+        tokens = (
+            chunk.choices[0].delta.content
+            for chunk in response_stream
+            if chunk.choices and chunk.choices[0].delta.content
+        )
+
+    assistant_reply = ""
+    for token in tokens:
+        assistant_reply += token
+        yield sse({"token": token})
+
+    messages.append({"role": "assistant", "content": assistant_reply})
+    if best_route == "products" and cached_reply is None:
+        stack.semantic_cache.store(turn["query_embedding"], products_fingerprint, assistant_reply, query=rewritten_query)
+    yield sse({"reply": assistant_reply, "cached": cached_reply is not None}, "done")
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    """Body: {"message": "...", "session_id": "..." (tuỳ chọn)}. Trả về stream text/event-stream"""
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    query = body.get("message") or ""
+    if not isinstance(query, str):
+        return jsonify({"error": "message must be a string"}), 400
+    query = query.strip()
+    if not query:
+        return jsonify({"error": "message is required"}), 400
+    session_id = body.get("session_id") or uuid.uuid4().hex
+    # session_id được hash trong session_lock và làm key của session_store
+    if not isinstance(session_id, str):
+        return jsonify({"error": "session_id must be a string"}), 400
+    stack = get_stack()
+
+    def generate():
+        with session_lock(session_id):
+            messages, product_context = load_session(session_id)
+            yield sse({"session_id": session_id}, "session")
+            try:
+                yield from chat_events(stack, messages, product_context, query)
+                save_session(session_id, messages, product_context)
+            except Exception as e:
+                yield sse({"error": str(e)}, "error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/retrieve", methods=["POST"])
+def retrieve():
+    """
+    Body: {"query": "...", "limit": 5, "filter": {"price": {"$lte": 5000000}}} (filter tuỳ chọn, xem metadata_filter.py).
+    Trả về sản phẩm liên quan, không gọi LLM
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    query = body.get("query") or ""
+    if not isinstance(query, str):
+        return jsonify({"error": "query must be a string"}), 400
+    query = query.strip()
+    if not query:
+        return jsonify({"error": "query is required"}), 400
+    limit = body.get("limit", 5)
+    if isinstance(limit, bool):
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+    # Giới hạn số kết quả để một request không kéo cả collection
+    limit = min(max(limit, 1), MAX_RETRIEVE_LIMIT)
+    filter = body.get("filter")
+    try:
+        # Kiểm tra filter trước khi tốn một lần gọi embedding
+        normalize_filter(filter)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stack = get_stack()
+    query_embedding = stack.embedding.encode(query)
+    candidates = stack.vector_db.query("products", query_embedding, limit=max(limit, 10) if stack.reranker else limit, filter=filter)
+    results = stack.rerank(query, candidates, limit=limit)
+    return jsonify({
+        "query": query,
+        "results": [{"title": r["title"], "information": r["information"], "score": r.get("score")} for r in results]
+    })
+
+@app.route("/health", methods=["GET"])
+def health():
+    if _stack is None:
+        status = "error" if _stack_error else "warming"
+        return jsonify({"status": status, "error": _stack_error, "pid": os.getpid()}), 503
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "sessions": session_store.stats(),
+        "pipeline": _stack.pipeline.stats(),
+        "reflection": _stack.pipeline.reflection.stats(),
+        "semantic_cache": _stack.semantic_cache.stats(),
+        "reranker": _stack.reranker.stats() if _stack.reranker else None,
+    })
+
+def _warm_up():
+    try:
+        get_stack()
+        print(f"✅ Worker {os.getpid()} sẵn sàng.")
+    except Exception as e:
+        print(f"❌ Worker {os.getpid()} khởi tạo lỗi: {e}")
+
+# Mỗi worker gunicorn import module riêng nên tự khởi tạo stack ở nền, /health báo "warming" tới khi xong
+threading.Thread(target=_warm_up, daemon=True).start()
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 8000)), threaded=True)
@@ -0,0 +1,249 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def encode_session(session: dict) -> bytes:
+    """Compact JSON (không khoảng trắng, giữ nguyên tiếng Việt) nén bằng zlib"""
+    return zlib.compress(json.dumps(session, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_session(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class SessionStore:
+    """
+    Conversation sessions keyed by session_id.
+
+    A session is a JSON-serializable dict. Backends store it encoded with
+    encode_session and implement the *_encoded methods, so sessions can be
+    moved between tiers without re-encoding.
+    """
+
+    def get(self, session_id: str):
+        data = self.get_encoded(session_id)
+        return decode_session(data) if data is not None else None
+
+    def put(self, session_id: str, session: dict):
+        self.put_encoded(session_id, encode_session(session))
+
+    def get_encoded(self, session_id: str):
+        raise NotImplementedError
+
+    def put_encoded(self, session_id: str, data: bytes):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def memory_usage(self, session_id: str = None) -> int:
+        """Bytes used by one session, or by the whole store"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU of compressed sessions with an idle TTL.
+
+    Sessions over max_sessions / max_bytes, or idle for longer than
+    idle_ttl, are evicted oldest first, to the spill store if one is given
+    and dropped otherwise. A spilled session is moved back into memory the
+    next time it is read.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, max_bytes: int = 256 * 1024 * 1024, idle_ttl: float = 1800,
+                 spill: SessionStore = None):
+        """
+        :param max_sessions: Số phiên tối đa giữ trong RAM
+        :param max_bytes: Tổng dung lượng (đã nén) tối đa trong RAM
+        :param idle_ttl: Phiên không hoạt động quá số giây này bị đẩy ra khỏi RAM
+        :param spill: Store phía sau (vd: SQLiteSessionStore), None thì phiên bị xoá hẳn
+        """
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.spill = spill
+        self._sessions = OrderedDict()  # session_id -> (data, last_access)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_encoded(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                data, _ = self._sessions.pop(session_id)
+                self._sessions[session_id] = (data, time.time())
+                self.hits += 1
+                return data
+        data = self.spill.get_encoded(session_id) if self.spill is not None else None
+        if data is None:
+            self.misses += 1
+            return None
+        # Phiên được dùng lại: đưa về RAM
+        self.spill_hits += 1
+        self.spill.delete(session_id)
+        self.put_encoded(session_id, data)
+        return data
+
+    def put_encoded(self, session_id: str, data: bytes):
+        with self._lock:
+            if session_id in self._sessions:
+                self._bytes -= len(self._sessions.pop(session_id)[0])
+            self._sessions[session_id] = (data, time.time())
+            self._bytes += len(data)
+            evicted = self._evict()
+        self._spill(evicted)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._bytes -= len(self._sessions.pop(session_id)[0])
+        if self.spill is not None:
+            self.spill.delete(session_id)
+
+    def expire(self):
+        """Đẩy các phiên đã hết idle_ttl ra khỏi RAM"""
+        with self._lock:
+            evicted = self._evict()
+        self._spill(evicted)
+
+    def _evict(self):
+        evicted = []
+        now = time.time()
+        while self._sessions:
+            session_id, (data, last_access) = next(iter(self._sessions.items()))
+            over_limit = len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+            if not over_limit and now - last_access <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self._bytes -= len(data)
+            self.evictions += 1
+            evicted.append((session_id, data))
+        return evicted
+
+    def _spill(self, evicted):
+        if self.spill is not None:
+            for session_id, data in evicted:
+                self.spill.put_encoded(session_id, data)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def memory_usage(self, session_id: str = None) -> int:
+        with self._lock:
+            if session_id is None:
+                return self._bytes
+            return len(self._sessions[session_id][0]) if session_id in self._sessions else 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = [len(data) for data, _ in self._sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "memory_bytes": sum(sizes),
+            "avg_session_bytes": sum(sizes) / len(sizes) if sizes else 0.0,
+            "max_session_bytes": max(sizes, default=0),
+            "hits": self.hits,
+            "spill_hits": self.spill_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "spilled_sessions": len(self.spill) if self.spill is not None else 0,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Cold sessions on disk, one compressed blob per session"""
+
+    def __init__(self, path: str = "sessions.sqlite", max_age: float = 7 * 24 * 3600):
+        """
+        :param max_age: Phiên không được cập nhật quá số giây này bị xoá khi gọi purge()
+        """
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated)")
+        self._conn.commit()
+
+    def get_encoded(self, session_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def put_encoded(self, session_id: str, data: bytes):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated) VALUES (?, ?, ?)",
+                (session_id, data, time.time())
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def purge(self) -> int:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.max_age,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def memory_usage(self, session_id: str = None) -> int:
+        with self._lock:
+            if session_id is None:
+                return self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()[0]
+            row = self._conn.execute("SELECT LENGTH(data) FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+
+    # Mô phỏng nhiều phiên hội thoại: đo dung lượng RAM và đĩa
+    path = os.path.join(tempfile.mkdtemp(), "sessions.sqlite")
+    store = MemorySessionStore(max_sessions=2_000, spill=SQLiteSessionStore(path))
+    turns = ["Điện thoại Samsung Galaxy A05s giá bao nhiêu?", "Còn màu đen không em?", "Pin dùng được bao lâu?"]
+    raw_bytes = 0
+    for i in range(10_000):
+        session = {"messages": [], "products": {}}
+        for query in random.sample(turns, 2):
+            session["messages"].append({"role": "user", "content": query})
+            session["messages"].append({"role": "assistant", "content": "Dạ, " + query * 5})
+        raw_bytes += len(json.dumps(session, ensure_ascii=False).encode("utf-8"))
+        store.put(f"session-{i}", session)
+
+    stats = store.stats()
+    print(f"💾 RAM: {stats['sessions']} phiên, {stats['memory_bytes'] / 1024:.0f} KB, TB {stats['avg_session_bytes']:.0f} B/phiên")
+    print(f"💾 SQLite: {stats['spilled_sessions']} phiên, {store.spill.memory_usage() / 1024:.0f} KB")
+    print(f"📦 JSON gốc: {raw_bytes / 1024:.0f} KB")
+    assert store.get("session-0")["messages"], "spilled session should be readable"
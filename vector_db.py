@@ -1,41 +1,94 @@
 
-from pymongo import MongoClient
-from chromadb import HttpClient
-from qdrant_client import QdrantClient
-from supabase import create_client, Client
 from dotenv import load_dotenv
-from qdrant_client import models as qdrant_models
-load_dotenv()
+from metadata_filter import to_mongo, to_chroma, to_qdrant, apply_postgrest
 import os
+import uuid
 
 load_dotenv()
 
+# Namespace cố định: cùng title -> cùng ID ở mọi process, mọi lần chạy
+_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "quangdatphone/products")
+
+def document_id(title: str) -> str:
+    """Stable UUIDv5 of a product title: Qdrant point ID, Chroma ID and MongoDB _id"""
+    return str(uuid.uuid5(_ID_NAMESPACE, title))
+
+# Driver của từng backend chỉ được import khi backend đó được chọn
+def _mongodb_client(**options):
+    from pymongo import MongoClient
+    return MongoClient(os.getenv("MONGODB_URI"))
+
+def _chromadb_client(**options):
+    from chromadb import HttpClient
+    return HttpClient(
+        host="localhost", 
+        port=8123
+    )
+
+def _qdrant_client(**options):
+    from qdrant_client import QdrantClient
+    return QdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_KEY"),
+    )
+
+def _supabase_client(**options):
+    from supabase import create_client, Client
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_KEY")
+    supabase: Client = create_client(
+        supabase_url=url,
+        supabase_key=key
+        )
+    return supabase
+
+def _local_client(**options):
+    from local_vector_store import LocalVectorStore
+    return LocalVectorStore(**options)
+
+BACKENDS = {
+    "mongodb": _mongodb_client,
+    "chromadb": _chromadb_client,
+    "qdrant": _qdrant_client,
+    "supabase": _supabase_client,
+    "local": _local_client,
+}
+
+def register_backend(name: str, factory):
+    """
+    Register a backend usable as VectorDatabase(db_type=name, **options).
+
+    :param factory: factory(**options) -> store có cùng các method với LocalVectorStore
+                    (insert_documents, update_documents, delete_documents, document_fingerprints,
+                    query, document_exists, existing_titles, count_documents, ...)
+    """
+    BACKENDS[name] = factory
+
+def _batches(items: list, batch_size: int):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def _metadata(document: dict) -> dict:
+    """Các trường ngoài title / information / embedding (vd: content_hash, price); Chroma không nhận giá trị None"""
+    return {
+        key: value for key, value in document.items()
+        if key not in ("title", "information", "embedding", "_id") and value is not None
+    }
+
 class VectorDatabase:
-    def __init__(self, db_type: str):
+    def __init__(self, db_type: str, **options):
+        """
+        :param db_type: mongodb | chromadb | qdrant | supabase | local | backend đã register_backend
+        :param options: Tham số cho backend local (vd: path="local_vector_db", mmap=True, index="ivf", quantization="int8")
+        """
         self.db_type = db_type
-        if self.db_type == "mongodb":
-            self.client = MongoClient(os.getenv("MONGODB_URI"))
-        elif self.db_type == "chromadb":
-            self.client = HttpClient(
-                host="localhost", 
-                port=8123
-            )
-        elif self.db_type == "qdrant":
-            self.client = QdrantClient(
-                url=os.getenv("QDRANT_URL"),
-                api_key=os.getenv("QDRANT_KEY"),
-            )
-        elif self.db_type == "supabase":
-            url: str = os.environ.get("SUPABASE_URL")
-            key: str = os.environ.get("SUPABASE_KEY")
-            supabase: Client = create_client(
-                supabase_url=url,
-                supabase_key=key
-                )
-            self.client = supabase
+        if self.db_type not in BACKENDS:
+            raise ValueError(f"Unsupported database type: {db_type}")
+        self.client = BACKENDS[self.db_type](**options)
     def _ensure_collection_exists(self, collection_name: str):
         """Ensure collection exists for Qdrant, create if it doesn't"""
         if self.db_type == "qdrant":
+            from qdrant_client import models as qdrant_models
             if not self.client.collection_exists(collection_name=collection_name):
                 print(f"[Info] Collection '{collection_name}' not found. Creating it...")
                 self.client.create_collection(
@@ -53,65 +106,309 @@ class VectorDatabase:
                     field_name="title",
                     field_schema=qdrant_models.PayloadSchemaType.KEYWORD
                 )
+                # Index cho các thuộc tính hay dùng trong filter của query()
+                attribute_schemas = {
+                    "brand": qdrant_models.PayloadSchemaType.KEYWORD,
+                    "has_promotion": qdrant_models.PayloadSchemaType.BOOL,
+                    "price": qdrant_models.PayloadSchemaType.INTEGER,
+                    "ram_gb": qdrant_models.PayloadSchemaType.FLOAT,
+                    "storage_gb": qdrant_models.PayloadSchemaType.FLOAT,
+                }
+                for field_name, field_schema in attribute_schemas.items():
+                    self.client.create_payload_index(
+                        collection_name=collection_name,
+                        field_name=field_name,
+                        field_schema=field_schema
+                    )
                 return True  # Collection was created
         return False  # Collection already existed or not Qdrant
+    def _qdrant_point(self, document: dict) -> dict:
+        return {
+            "id": document_id(document["title"]),
+            "vector": document["embedding"],
+            "payload": {
+                "title": document["title"],
+                "information": document["information"],
+                **_metadata(document)
+            }
+        }
+    def _chroma_write(self, collection, documents: list, update: bool = False):
+        """
+        upsert (update=True: update, không tạo bản ghi mới) một batch vào Chroma.
+        Chroma gộp metadata khi upsert/update và không nhận giá trị None, nên một
+        thuộc tính trở thành None (vd: giá chuyển thành "Liên hệ") sẽ giữ giá trị cũ
+        và vẫn khớp filter; các bản ghi đó được xoá rồi thêm lại với metadata đầy đủ.
+        """
+        cleared = [document for document in documents if any(value is None for value in document.values())]
+        merged = [document for document in documents if not any(value is None for value in document.values())]
+        if merged and update:
+            collection.update(
+                ids=[document_id(document["title"]) for document in merged],
+                documents=[document["information"] for document in merged] if all("information" in document for document in merged) else None,
+                embeddings=[document["embedding"] for document in merged] if all("embedding" in document for document in merged) else None,
+                metadatas=[{"title": document["title"], **_metadata(document)} for document in merged]
+            )
+        elif merged:
+            collection.upsert(
+                documents=[document["information"] for document in merged],
+                embeddings=[document["embedding"] for document in merged],
+                metadatas=[{"title": document["title"], **_metadata(document)} for document in merged],
+                ids=[document_id(document["title"]) for document in merged]
+            )
+        if not cleared:
+            return
+        ids = [document_id(document["title"]) for document in cleared]
+        stored = collection.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        found = {
+            id_: (embedding, information, metadata or {})
+            for id_, embedding, information, metadata in zip(stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"])
+        }
+        records = []
+        for id_, document in zip(ids, cleared):
+            embedding, information, metadata = found.get(id_, (None, None, {}))
+            embedding = document.get("embedding", embedding)
+            if embedding is None:
+                # update của bản ghi chưa có: bỏ qua giống collection.update
+                continue
+            metadata = {**metadata, "title": document["title"], **{key: value for key, value in document.items() if key not in ("title", "information", "embedding", "_id")}}
+            records.append((id_, embedding, document.get("information", information), {key: value for key, value in metadata.items() if value is not None}))
+        if found:
+            collection.delete(ids=list(found))
+        if records:
+            collection.add(
+                ids=[record[0] for record in records],
+                embeddings=[record[1] for record in records],
+                documents=[record[2] for record in records],
+                metadatas=[record[3] for record in records]
+            )
     def insert_document(self, collection_name: str, document: dict):
+        """Upsert: ghi lại cùng một sản phẩm (cùng title) thay thế bản cũ, không tạo bản trùng"""
         if self.db_type == "mongodb":
             db = self.client.get_database("vector_db")
             collection = db[collection_name]
-            collection.insert_one(document)
+            _id = document_id(document["title"])
+            collection.replace_one({"_id": _id}, {**document, "_id": _id}, upsert=True)
         elif self.db_type == "chromadb":
             collection = self.client.get_or_create_collection(name=collection_name)
-            collection.add(
-                documents=[document["information"]],
-                embeddings=[document["embedding"]],
-                ids=[document["title"]]
-            )
+            self._chroma_write(collection, [document])
         elif self.db_type == "qdrant":
             self._ensure_collection_exists(collection_name)
             
             # Insert the document as a point
             self.client.upsert(
                 collection_name=collection_name,
-                points=[
-                    {
-                        "id": hash(document["title"]) % (2**63),  # Generate unique ID from title
-                        "vector": document["embedding"],
-                        "payload": {
-                            "title": document["title"],
-                            "information": document["information"]
-                        }
-                    }
-                ]
+                points=[self._qdrant_point(document)]
             )
         elif self.db_type == "supabase":
-            self.client.table(collection_name).insert(document).execute()
-    def query(self, collection_name: str, query_vector: list, limit: int = 5):
+            self.client.table(collection_name).upsert(document, on_conflict="title").execute()
+        else:
+            self.client.insert_document(collection_name, document)
+    def insert_documents(self, collection_name: str, documents: list, batch_size: int = 256):
+        """
+        Upsert many documents using one round trip per batch. IDs come from
+        document_id(title), so re-running an ingest overwrites instead of
+        duplicating and needs no existence check first.
+        """
+        documents = list(documents)
+        if not documents:
+            return
+        if self.db_type == "mongodb":
+            from pymongo import ReplaceOne
+            db = self.client.get_database("vector_db")
+            collection = db[collection_name]
+            for batch in _batches(documents, batch_size):
+                collection.bulk_write(
+                    [
+                        ReplaceOne({"_id": document_id(document["title"])}, {**document, "_id": document_id(document["title"])}, upsert=True)
+                        for document in batch
+                    ],
+                    ordered=False
+                )
+        elif self.db_type == "chromadb":
+            collection = self.client.get_or_create_collection(name=collection_name)
+            for batch in _batches(documents, batch_size):
+                self._chroma_write(collection, batch)
+        elif self.db_type == "qdrant":
+            self._ensure_collection_exists(collection_name)
+            for batch in _batches(documents, batch_size):
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=[self._qdrant_point(document) for document in batch]
+                )
+        elif self.db_type == "supabase":
+            for batch in _batches(documents, batch_size):
+                self.client.table(collection_name).upsert(batch, on_conflict="title").execute()
+        else:
+            self.client.insert_documents(collection_name, documents)
+    def update_documents(self, collection_name: str, documents: list, batch_size: int = 256):
+        """
+        Patch documents matched by title. Only the given fields change; a
+        document without "embedding" keeps its stored vector.
+        """
+        documents = list(documents)
+        if not documents:
+            return
         if self.db_type == "mongodb":
+            from pymongo import UpdateOne
             db = self.client.get_database("vector_db")
             collection = db[collection_name]
+            for batch in _batches(documents, batch_size):
+                collection.bulk_write(
+                    [
+                        UpdateOne({"title": document["title"]}, {"$set": {key: value for key, value in document.items() if key != "_id"}})
+                        for document in batch
+                    ],
+                    ordered=False
+                )
+        elif self.db_type == "chromadb":
+            collection = self.client.get_or_create_collection(name=collection_name)
+            for batch in _batches(documents, batch_size):
+                self._chroma_write(collection, batch, update=True)
+        elif self.db_type == "qdrant":
+            from qdrant_client import models as qdrant_models
+            self._ensure_collection_exists(collection_name)
+            # Có embedding: ghi đè cả point; chỉ đổi thông tin: cập nhật payload, giữ nguyên vector
+            reembedded = [document for document in documents if "embedding" in document]
+            patched = [document for document in documents if "embedding" not in document]
+            for batch in _batches(reembedded, batch_size):
+                self.client.upsert(
+                    collection_name=collection_name,
+                    points=[self._qdrant_point(document) for document in batch]
+                )
+            for batch in _batches(patched, batch_size):
+                self.client.batch_update_points(
+                    collection_name=collection_name,
+                    update_operations=[
+                        qdrant_models.SetPayloadOperation(
+                            set_payload=qdrant_models.SetPayload(
+                                payload={key: value for key, value in document.items() if key != "_id"},
+                                filter=qdrant_models.Filter(must=[
+                                    qdrant_models.FieldCondition(key="title", match=qdrant_models.MatchValue(value=document["title"]))
+                                ])
+                            )
+                        )
+                        for document in batch
+                    ]
+                )
+        elif self.db_type == "supabase":
+            # PostgREST upsert chỉ ghi các cột được gửi lên, cột embedding giữ nguyên nếu không có
+            for batch in _batches(documents, batch_size):
+                self.client.table(collection_name).upsert(batch, on_conflict="title").execute()
+        else:
+            self.client.update_documents(collection_name, documents)
+    def delete_documents(self, collection_name: str, titles: list, batch_size: int = 256):
+        titles = list(dict.fromkeys(titles))
+        if not titles:
+            return
+        if self.db_type == "mongodb":
+            db = self.client.get_database("vector_db")
+            collection = db[collection_name]
+            for batch in _batches(titles, batch_size):
+                collection.delete_many({"title": {"$in": batch}})
+        elif self.db_type == "chromadb":
+            collection = self.client.get_or_create_collection(name=collection_name)
+            for batch in _batches(titles, batch_size):
+                collection.delete(ids=[document_id(title) for title in batch])
+        elif self.db_type == "qdrant":
+            from qdrant_client import models as qdrant_models
+            if not self.client.collection_exists(collection_name=collection_name):
+                return
+            for batch in _batches(titles, batch_size):
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=qdrant_models.FilterSelector(
+                        filter=qdrant_models.Filter(must=[
+                            qdrant_models.FieldCondition(key="title", match=qdrant_models.MatchAny(any=batch))
+                        ])
+                    )
+                )
+        elif self.db_type == "supabase":
+            for batch in _batches(titles, batch_size):
+                self.client.table(collection_name).delete().in_("title", batch).execute()
+        else:
+            self.client.delete_documents(collection_name, titles)
+    def document_fingerprints(self, collection_name: str, fields: list = ("content_hash", "metadata_hash"), batch_size: int = 1000) -> dict:
+        """{title: {field: value}} for every stored document, without fetching embeddings"""
+        fields = list(fields)
+        fingerprints = {}
+        if self.db_type == "mongodb":
+            db = self.client.get_database("vector_db")
+            collection = db[collection_name]
+            projection = {"title": 1, "_id": 0, **{field: 1 for field in fields}}
+            for doc in collection.find({}, projection):
+                fingerprints[doc["title"]] = {field: doc.get(field) for field in fields}
+        elif self.db_type == "chromadb":
+            collection = self.client.get_or_create_collection(name=collection_name)
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+                for metadata in page["metadatas"]:
+                    fingerprints[metadata["title"]] = {field: metadata.get(field) for field in fields}
+                if len(page["ids"]) < batch_size:
+                    break
+                offset += batch_size
+        elif self.db_type == "qdrant":
+            if not self.client.collection_exists(collection_name=collection_name):
+                return fingerprints
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=collection_name,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=["title", *fields],
+                    with_vectors=False
+                )
+                for point in points:
+                    fingerprints[point.payload["title"]] = {field: point.payload.get(field) for field in fields}
+                if offset is None:
+                    break
+        elif self.db_type == "supabase":
+            start = 0
+            while True:
+                response = self.client.table(collection_name).select(",".join(["title", *fields])).range(start, start + batch_size - 1).execute()
+                for row in response.data:
+                    fingerprints[row["title"]] = {field: row.get(field) for field in fields}
+                if len(response.data) < batch_size:
+                    break
+                start += batch_size
+        else:
+            fingerprints = self.client.document_fingerprints(collection_name, fields)
+        return fingerprints
+    def query(self, collection_name: str, query_vector: list, limit: int = 5, filter: dict = None):
+        """
+        :param filter: Điều kiện trên metadata, lọc ngay trong index của backend (xem metadata_filter.py),
+                       vd: {"brand": "samsung", "price": {"$lte": 5_000_000}}
+        """
+        if self.db_type == "mongodb":
+            db = self.client.get_database("vector_db")
+            collection = db[collection_name]
+            vector_search = {
+                "index": "vector_index",  # tên index bạn đã tạo
+                "queryVector": query_vector,
+                "path": "embedding",
+                "numCandidates": 100,
+                "limit": limit
+            }
+            if filter:
+                # Các trường lọc phải được khai báo {"type": "filter", "path": ...} trong vector_index
+                vector_search["filter"] = to_mongo(filter)
             results = collection.aggregate([
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",  # tên index bạn đã tạo
-                        "queryVector": query_vector,
-                        "path": "embedding",
-                        "numCandidates": 100,
-                        "limit": limit
-                    }
-                }
+                {"$vectorSearch": vector_search},
+                {"$addFields": {"score": {"$meta": "vectorSearchScore"}}}
             ])
             return list(results)
         elif self.db_type == "chromadb":
             collection = self.client.get_or_create_collection(name=collection_name)
             results = collection.query(
                 query_embeddings=[query_vector],
-                n_results=limit
+                n_results=limit,
+                where=to_chroma(filter)
             )
             docs = []
             for i in range(len(results["ids"][0])):
                 docs.append({
-                    "title": results["ids"][0][i],
+                    "title": results["metadatas"][0][i]["title"],
                     "information": results["documents"][0][i]
                 })
             return docs
@@ -123,6 +420,7 @@ class VectorDatabase:
             results = self.client.search(
                 collection_name=collection_name,
                 query_vector=query_vector,
+                query_filter=to_qdrant(filter),
                 limit=limit
             )
             
@@ -136,8 +434,22 @@ class VectorDatabase:
                 })
             return formatted_results
         elif self.db_type == "supabase":
-            response = self.client.table(collection_name).select("*").execute()
-            return response.data
+            # Tìm kiếm ngay trong Postgres bằng pgvector: hàm match_<collection> (DDL ở cuối rag.py)
+            builder = self.client.rpc(
+                f"match_{collection_name}",
+                {"query_embedding": [float(value) for value in query_vector]}
+            )
+            response = apply_postgrest(builder, filter).limit(limit).execute()
+            return [
+                {
+                    "title": row["title"],
+                    "information": row["information"],
+                    "score": row["score"]
+                }
+                for row in response.data
+            ]
+        else:
+            return self.client.query(collection_name, query_vector, limit, filter)
     def document_exists(self, collection_name, filter_query):
         if self.db_type == "mongodb":
             db = self.client.get_database("vector_db")
@@ -146,9 +458,8 @@ class VectorDatabase:
         elif self.db_type == "chromadb":
             try:
                 collection = self.client.get_or_create_collection(name=collection_name)
-                # Lấy toàn bộ ID hiện có trong collection
-                all_ids = collection.get()["ids"]
-                return filter_query["title"] in all_ids
+                # Chỉ lấy đúng ID cần kiểm tra thay vì toàn bộ collection
+                return len(collection.get(ids=[document_id(filter_query["title"])], include=[])["ids"]) > 0
             except Exception as e:
                 print(f"Error checking existence in ChromaDB: {e}")
                 return False
@@ -157,21 +468,15 @@ class VectorDatabase:
                 print(f"[Info] Collection '{collection_name}' doesn't exist yet")
                 return False
                 
-            # Search for document with matching title
+            # Lấy thẳng point theo ID thay vì scroll với filter
             try:
-                result = self.client.scroll(
+                result = self.client.retrieve(
                     collection_name=collection_name,
-                    scroll_filter={
-                        "must": [
-                            {
-                                "key": "title",
-                                "match": {"value": filter_query["title"]}
-                            }
-                        ]
-                    },
-                    limit=1
+                    ids=[document_id(filter_query["title"])],
+                    with_payload=False,
+                    with_vectors=False
                 )
-                return len(result[0]) > 0
+                return len(result) > 0
             except Exception as e:
                 print(f"Error checking document existence in Qdrant: {e}")
                 return False
@@ -179,12 +484,47 @@ class VectorDatabase:
             response = self.client.table(collection_name).select("*").eq("title", filter_query["title"]).execute()
             return len(response.data) > 0
         else:
-            raise ValueError("Unsupported database type")
+            return self.client.document_exists(collection_name, filter_query)
+    def existing_titles(self, collection_name: str, titles: list, batch_size: int = 256) -> set:
+        """Return the subset of titles already stored, one round trip per batch"""
+        titles = list(dict.fromkeys(titles))
+        found = set()
+        if self.db_type == "mongodb":
+            db = self.client.get_database("vector_db")
+            collection = db[collection_name]
+            for batch in _batches(titles, batch_size):
+                for doc in collection.find({"title": {"$in": batch}}, {"title": 1, "_id": 0}):
+                    found.add(doc["title"])
+        elif self.db_type == "chromadb":
+            collection = self.client.get_or_create_collection(name=collection_name)
+            for batch in _batches(titles, batch_size):
+                ids = {document_id(title): title for title in batch}
+                found.update(ids[_id] for _id in collection.get(ids=list(ids), include=[])["ids"])
+        elif self.db_type == "qdrant":
+            if not self.client.collection_exists(collection_name=collection_name):
+                return found
+            for batch in _batches(titles, batch_size):
+                points = self.client.retrieve(
+                    collection_name=collection_name,
+                    ids=[document_id(title) for title in batch],
+                    with_payload=["title"],
+                    with_vectors=False
+                )
+                found.update(point.payload["title"] for point in points)
+        elif self.db_type == "supabase":
+            for batch in _batches(titles, batch_size):
+                response = self.client.table(collection_name).select("title").in_("title", batch).execute()
+                found.update(row["title"] for row in response.data)
+        else:
+            found = self.client.existing_titles(collection_name, titles)
+        return found
     def count_documents(self, collection_name: str) -> int:
         if self.db_type == "mongodb":
             db = self.client.get_database("vector_db")  # Đảm bảo đúng tên DB
             collection = db[collection_name]
             return collection.count_documents({})
+        elif self.db_type in ("chromadb", "qdrant", "supabase"):
+            raise NotImplementedError("count_documents chỉ hỗ trợ MongoDB, local và backend đã đăng ký trong phiên bản này.")
         else:
-            raise NotImplementedError("count_documents chỉ hỗ trợ MongoDB trong phiên bản này.")
+            return self.client.count_documents(collection_name)
 